@@ -0,0 +1,50 @@
+# apps/accounts/cache_http.py
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def validador_querysets(*fuentes, extra=""):
+    """
+    Validador barato para listados: COUNT + MAX(campo) de cada (queryset, campo).
+    Cambia al crear, editar o borrar filas. Devuelve (etag, ultima_modificacion).
+    """
+    partes = [extra]
+    ultimo = None
+    for queryset, campo in fuentes:
+        resumen = queryset.order_by().aggregate(total=Count("pk"), ultimo=Max(campo))
+        partes.append(f"{resumen['total']}:{resumen['ultimo'].isoformat() if resumen['ultimo'] else '-'}")
+        if resumen["ultimo"] and (ultimo is None or resumen["ultimo"] > ultimo):
+            ultimo = resumen["ultimo"]
+    return hashlib.sha1("|".join(partes).encode()).hexdigest(), ultimo
+
+
+def respuesta_condicional(request, fuentes, generar, s_maxage=60, extra=""):
+    """
+    Respuesta con ETag / Last-Modified para acciones de solo lectura.
+    Si el cliente ya tiene la versión actual responde 304 sin llamar a 'generar'
+    (ni serializar); si no, devuelve Response(generar()).
+
+    Cache-Control permite que un proxy inverso guarde la respuesta 's_maxage'
+    segundos; Vary separa la copia por credenciales, así nunca se sirve a otro usuario.
+    """
+    etag, ultimo = validador_querysets(
+        *fuentes, extra=f"{request.build_absolute_uri('/')}|{extra}"
+    )
+    etag = quote_etag(etag)
+    last_modified = int(ultimo.timestamp()) if ultimo else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = Response(generar(), status=status.HTTP_200_OK)
+
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=0, s_maxage=s_maxage, must_revalidate=True)
+    patch_vary_headers(response, ("Authorization", "Cookie"))
+    return response
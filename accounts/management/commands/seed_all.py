@@ -202,6 +202,8 @@ TREE = {
                     {"label": "Editar Empresas", "code": "editar_empresas"},
                     {"label": "Eliminar Empresas", "code": "eliminar_empresas"},
                     {"label": "Aprobar Empresas", "code": "aprobar_empresas"},
+                    {"label": "Importar Empresas", "code": "importar_empresas"},
+                    {"label": "Cambiar Fase de Empresas", "code": "cambiar_fase_empresas"},
                 ],
             },
             {
@@ -342,6 +344,9 @@ TREE = {
                         {"label": "Crear Requisitos Input Valor", "code": "crear_requisitos_input_valor"},
                         {"label": "Editar Requisitos Input Valor", "code": "editar_requisitos_input_valor"},
                         {"label": "Eliminar Requisitos Input Valor", "code": "eliminar_requisitos_input_valor"},
+                        {"label": "Ver Completitud de Postulación", "code": "ver_completitud_postulacion"},
+                        {"label": "Analizar Valores de Todas las Empresas", "code": "analizar_requisitos_input_valor"},
+                        {"label": "Exportar Postulaciones (ZIP)", "code": "exportar_requisitos_input_valor"},
                     ],
                 },
                 # Aquí se añadieron los nuevos permisos para Evaluacion Dato
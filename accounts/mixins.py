@@ -0,0 +1,112 @@
+# apps/accounts/mixins.py
+from django.db import transaction
+from django.db.models import BooleanField, Case, Value, When
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .utils import log_user_action, user_has_perm_code
+
+
+class AccionesMasivasMixin:
+    """
+    Agrega POST <recurso>/acciones-masivas/ a un ModelViewSet.
+    Body: { "ids": [1, 2, 3], "operacion": "activar" | "desactivar" | "alternar" | "eliminar" }
+
+    Cada operación es un solo UPDATE (o DELETE) sobre get_queryset().filter(pk__in=ids)
+    y deja un único registro de auditoría. Los viewsets pueden ajustar:
+      - campo_estado: booleano que se activa/desactiva (por defecto 'is_active').
+      - accion_estado_masiva: acción del permission_code_map cuyo permiso se exige
+        para activar/desactivar/alternar (para 'eliminar' se usa el de 'destroy').
+        Si la acción no tiene código en el mapa, la operación responde 403.
+      - bloqueados_accion_masiva(ids, operacion): validación por conjunto; devuelve
+        {id: motivo} de las filas que no deben modificarse.
+      - despues_accion_masiva(ids, operacion): efectos que los signals harían fila a fila.
+    """
+    campo_estado = "is_active"
+    accion_estado_masiva = "toggle_status"
+    nombre_masivo = "registros"
+    OPERACIONES_MASIVAS = ("activar", "desactivar", "alternar", "eliminar")
+    MAX_IDS_MASIVOS = 1000
+
+    def bloqueados_accion_masiva(self, ids, operacion):
+        return {}
+
+    def despues_accion_masiva(self, ids, operacion):
+        pass
+
+    def _valores_accion_masiva(self, operacion):
+        campo = self.campo_estado
+        if operacion == "activar":
+            valor = Value(True)
+        elif operacion == "desactivar":
+            valor = Value(False)
+        else:
+            valor = Case(
+                When(**{campo: True}, then=Value(False)),
+                default=Value(True),
+                output_field=BooleanField(),
+            )
+        valores = {campo: valor}
+        # update() no aplica auto_now
+        if any(f.name == "updated_at" for f in self.get_queryset().model._meta.concrete_fields):
+            valores["updated_at"] = timezone.now()
+        return valores
+
+    @action(detail=False, methods=["post"], url_path="acciones-masivas")
+    def acciones_masivas(self, request):
+        operacion = request.data.get("operacion")
+        if operacion not in self.OPERACIONES_MASIVAS:
+            return Response(
+                {"error": f"operacion debe ser una de: {', '.join(self.OPERACIONES_MASIVAS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        accion = "destroy" if operacion == "eliminar" else self.accion_estado_masiva
+        code = self.permission_code_map.get(accion)
+        # Sin código mapeado la operación queda cerrada: una masiva nunca es más permisiva que la individual
+        if not code or not user_has_perm_code(request.user, code):
+            return Response({"detail": "No tiene permiso para realizar esta acción."}, status=status.HTTP_403_FORBIDDEN)
+
+        ids = request.data.get("ids")
+        if not isinstance(ids, list) or not ids or not all(str(i).isdigit() for i in ids):
+            return Response({"error": "ids debe ser una lista de ids numéricos"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.MAX_IDS_MASIVOS:
+            return Response(
+                {"error": f"Se admiten como máximo {self.MAX_IDS_MASIVOS} ids por llamada"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ids = {int(i) for i in ids}
+
+        with transaction.atomic():
+            queryset = self.get_queryset().filter(pk__in=ids).select_for_update(of=("self",))
+            encontrados = set(queryset.values_list("pk", flat=True))
+            bloqueados = self.bloqueados_accion_masiva(encontrados, operacion)
+            afectados = sorted(encontrados - set(bloqueados))
+
+            objetivo = self.get_queryset().model.objects.filter(pk__in=afectados)
+            if afectados:
+                if operacion == "eliminar":
+                    objetivo.delete()
+                else:
+                    objetivo.update(**self._valores_accion_masiva(operacion))
+                self.despues_accion_masiva(afectados, operacion)
+
+        if afectados:
+            log_user_action(
+                request.user,
+                f"Acción masiva '{operacion}' sobre {len(afectados)} {self.nombre_masivo}",
+                request,
+                extra={"operacion": operacion, "ids": afectados, "bloqueados": sorted(bloqueados)},
+            )
+
+        return Response(
+            {
+                "operacion": operacion,
+                "afectados": afectados,
+                "bloqueados": [{"id": pk, "error": motivo} for pk, motivo in sorted(bloqueados.items())],
+                "no_encontrados": sorted(ids - encontrados),
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -7,12 +7,14 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 from django.contrib.auth import authenticate
+from django.db.models import Exists, OuterRef
 
 from .models import Role, User, Permission, RolePermission, UserActionLog
 from .serializers import (
     RoleSerializer, UserSerializer, PasswordChangeSerializer,
     UserActionLogSerializer, PermissionTreeSerializer, PermissionSerializer
 )
+from .mixins import AccionesMasivasMixin
 from .permissions import HasPermissionMap
 from .utils import log_user_action
 
@@ -185,10 +187,11 @@ def permissions_tree(request):
 # =========================
 # VIEWSETS: Roles & Users
 # =========================
-class RoleViewSet(viewsets.ModelViewSet):
+class RoleViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = Role.objects.all().prefetch_related("permissions").order_by("id")
     serializer_class = RoleSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    nombre_masivo = "roles"
 
     # Map de permisos por acción del ViewSet
     permission_code_map = {
@@ -203,6 +206,21 @@ class RoleViewSet(viewsets.ModelViewSet):
         "get_permissions_list": "listar_roles",
     }
 
+    def bloqueados_accion_masiva(self, ids, operacion):
+        """
+        Misma regla que toggle_status, por conjunto: no se desactiva un rol activo
+        que tenga usuarios activos.
+        """
+        if operacion not in ("desactivar", "alternar"):
+            return {}
+        con_usuarios = Role.objects.filter(id__in=ids, is_active=True).filter(
+            Exists(User.objects.filter(role=OuterRef("pk"), is_active=True))
+        )
+        return {
+            role_id: "No se puede desactivar este rol porque tiene usuarios activos asignados."
+            for role_id in con_usuarios.values_list("id", flat=True)
+        }
+
     def perform_create(self, serializer):
         role = serializer.save()
         log_user_action(self.request.user, f"Creó rol '{role.name}'", self.request)
@@ -267,10 +285,12 @@ class RoleViewSet(viewsets.ModelViewSet):
 
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().select_related("role").order_by("id")
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    accion_estado_masiva = "toggle_active_status"
+    nombre_masivo = "usuarios"
 
     permission_code_map = {
         "list": "listar_usuarios",
@@ -284,6 +304,12 @@ class UserViewSet(viewsets.ModelViewSet):
         "listar_roles": "listar_usuarios",
     }
 
+    def bloqueados_accion_masiva(self, ids, operacion):
+        # El usuario no puede desactivarse ni eliminarse a sí mismo
+        if operacion != "activar" and self.request.user.id in ids:
+            return {self.request.user.id: "No puede aplicar esta acción sobre su propio usuario."}
+        return {}
+
     def perform_create(self, serializer):
         user = serializer.save()
         log_user_action(self.request.user, f"Creó usuario {user.email}", self.request)
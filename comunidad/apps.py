@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ComunidadConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'comunidad'
+
+    def ready(self):
+        from . import signals, task  # noqa: F401
@@ -0,0 +1,23 @@
+# apps/comunidad/conexion_redis.py
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+_redis_sync = None
+_redis_async = None
+
+
+def redis_sync():
+    # Un cliente (con su pool, seguro entre hilos) por proceso
+    global _redis_sync
+    if _redis_sync is None:
+        _redis_sync = redis.Redis.from_url(settings.COMUNIDAD_REDIS_URL, decode_responses=True)
+    return _redis_sync
+
+
+def redis_async():
+    # Un cliente (con su pool) por proceso ASGI
+    global _redis_async
+    if _redis_async is None:
+        _redis_async = aioredis.Redis.from_url(settings.COMUNIDAD_REDIS_URL, decode_responses=True)
+    return _redis_async
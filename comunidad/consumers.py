@@ -1,25 +1,65 @@
+import asyncio
 import json
+import time
+from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
 from .models import ChatRoom, Message, Post, Comment
 from django.contrib.auth.models import AnonymousUser
+from .serializers import MessageSerializer
+from .utils import MAX_LIMITE_HISTORIAL, evento_ws, historial_mensajes, insertar_mensaje
+from . import presencia
+from .conexion_redis import redis_async
+from .escritura_diferida import encolar_mensaje, mensajes_pendientes
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    # Cierre cuando el usuario no participa de la sala
+    CLOSE_NO_PARTICIPANTE = 4403
+    # Segundos sin frames de typing tras los que se considera que dejó de escribir
+    TYPING_TTL = 6
+    # Segundos mínimos entre renovaciones (Redis y keep-alive al grupo) del typing
+    TYPING_REFRESCO = 2
+
     async def connect(self):
         self.room_id = self.scope["url_route"]["kwargs"]["room_id"]
         self.room_group_name = f"chat_{self.room_id}"
+        self.joined = False
+        self.typing = False
+        self.typing_task = None
+        user = self.scope["user"]
+
+        # La pertenencia se valida una sola vez por conexión
+        if not user.is_authenticated or not await self.is_participant(user, self.room_id):
+            await self.accept()
+            await self.close(code=self.CLOSE_NO_PARTICIPANTE)
+            return
+
+        self.room_id = int(self.room_id)
+        self.sender = {
+            "id": user.id,
+            "username": user.username,
+            "avatar": user.avatar.url if user.avatar else None,
+        }
+
+        self.typing_key = f"comunidad:typing:{self.room_id}:{user.id}"
+        self.typing_ultimo_frame = self.typing_refrescado = 0
 
         # Join room group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        self.joined = True
         await self.accept()
-       
+
     async def disconnect(self, close_code):
         # Leave room group
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if self.joined:
+            await self.stop_typing()
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
     async def receive(self, text_data):
+        if not self.joined:
+            return
         text_data_json = json.loads(text_data)
         message_type = text_data_json.get("type")
 
@@ -27,68 +67,159 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.handle_chat_message(text_data_json)
         elif message_type == "typing":
             await self.handle_typing(text_data_json)
+        elif message_type == "backfill":
+            await self.handle_backfill(text_data_json)
 
     async def handle_chat_message(self, data):
-        message_content = data["message"]
-        user = self.scope["user"]
+        # Postgres no admite NUL en columnas text
+        message_content = str(data.get("message") or "").replace("\x00", "").strip()
+        if not message_content:
+            return
+        # client_id opcional: permite al cliente reintentar sin duplicar el mensaje
+        client_id = data.get("client_id")
+        # Enviar el mensaje termina el typing
+        await self.stop_typing()
 
-        # Save message to database
-        message = await self.save_message(user, self.room_id, message_content)
+        if settings.CHAT_WRITE_BEHIND:
+            # Se difunde sin esperar a Postgres; volcar_mensajes_chat lo persiste
+            message, nuevo = await encolar_mensaje(self.room_id, self.sender, message_content, client_id)
+            if not nuevo:
+                await self.send(text_data=json.dumps({"type": "message_ack", **message}))
+                return
+        else:
+            # Save message to database (un solo INSERT)
+            message_id, created_at = await self.save_message(self.room_id, self.sender["id"], message_content)
+            message = {
+                "id": message_id,
+                "content": message_content,
+                "sender": self.sender,
+                "created_at": created_at.isoformat(),
+                "client_id": client_id,
+            }
 
         # Send message to room group
         await self.channel_layer.group_send(
             self.room_group_name,
-            {
-                "type": "chat_message",
-                "message": {
-                    "id": message.id,
-                    "content": message.content,
-                    "sender": {
-                        "id": user.id,
-                        "username": user.username,
-                        "avatar": user.avatar.url if user.avatar else None, # Aquí ya está bien
-                    },
-                    "created_at": message.created_at.isoformat(),
-                },
-            },
+            evento_ws("chat_message", message=message),
+        )
+
+    async def handle_backfill(self, data):
+        """
+        { "type": "backfill", "last_seen_id": 123 } → mensajes posteriores a ese id
+        (hasta MAX_LIMITE_HISTORIAL por frame; si has_more, pedir otro con el último id).
+        Sin last_seen_id devuelve la página más reciente.
+        """
+        last_seen_id = data.get("last_seen_id")
+        if last_seen_id is not None and not str(last_seen_id).isdigit():
+            await self.send(text_data=json.dumps({"type": "error", "error": "last_seen_id inválido"}))
+            return
+
+        messages, has_more = await self.get_backfill(
+            self.room_id, int(last_seen_id) if last_seen_id is not None else None
+        )
+        await self.send(
+            text_data=json.dumps({"type": "backfill", "messages": messages, "has_more": has_more})
         )
 
     async def handle_typing(self, data):
-        user = self.scope["user"]
-        is_typing = data.get("is_typing", False)
-        print(is_typing)
+        if data.get("is_typing", False):
+            await self.start_typing()
+        else:
+            await self.stop_typing()
+
+    async def start_typing(self):
+        """
+        Los frames de typing (uno por tecla) solo renuevan el estado local; a Redis y
+        al grupo se va como mucho cada TYPING_REFRESCO segundos. Cada renovación se
+        difunde como keep-alive: el cliente re-arma el indicador por `ttl` y no lo
+        oculta mientras el usuario sigue escribiendo.
+        """
+        ahora = time.monotonic()
+        self.typing_ultimo_frame = ahora
+        if self.typing and ahora - self.typing_refrescado < self.TYPING_REFRESCO:
+            return
+        self.typing_refrescado = ahora
+
+        # La clave es por (sala, usuario): varias pestañas comparten el estado
+        await redis_async().set(self.typing_key, 1, ex=self.TYPING_TTL)
+        if not self.typing:
+            self.typing = True
+            self.typing_task = asyncio.create_task(self.expire_typing())
+        await self.send_typing_status(True)
 
+    async def stop_typing(self):
+        if not self.typing:
+            return
+        self.typing = False
+        if self.typing_task and self.typing_task is not asyncio.current_task():
+            self.typing_task.cancel()
+        self.typing_task = None
+        # La clave pudo vencer antes que el temporizador local (cuenta desde la última
+        # renovación): el fin se difunde siempre. Si otra pestaña sigue escribiendo,
+        # su próximo keep-alive vuelve a mostrar el indicador.
+        await redis_async().delete(self.typing_key)
+        await self.send_typing_status(False)
+
+    async def expire_typing(self):
+        # Sin frames durante TYPING_TTL segundos el usuario deja de escribir
+        while self.typing:
+            restante = self.typing_ultimo_frame + self.TYPING_TTL - time.monotonic()
+            if restante <= 0:
+                await self.stop_typing()
+                return
+            await asyncio.sleep(restante)
+
+    async def send_typing_status(self, is_typing):
         await self.channel_layer.group_send(
             self.room_group_name,
-            {
-                "type": "typing_status",
-                "user": {"id": user.id, "username": user.username},
-                "is_typing": is_typing,
-            },
+            evento_ws(
+                "typing_status",
+                user={"id": self.sender["id"], "username": self.sender["username"]},
+                is_typing=is_typing,
+                # Por si el aviso de fin se pierde (p. ej. caída del worker)
+                ttl=self.TYPING_TTL,
+            ),
         )
 
+    # Los eventos llegan ya serializados (evento_ws): se reenvían sin re-codificar
     async def chat_message(self, event):
-        # Send message to WebSocket
-        await self.send(
-            text_data=json.dumps({"type": "chat_message", "message": event["message"]})
-        )
+        await self.send(text_data=event["text"])
 
     async def typing_status(self, event):
-        # Send typing status to WebSocket
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "typing_status",
-                    "user": event["user"],
-                    "is_typing": event["is_typing"],
-                }
-            )
-        )
+        await self.send(text_data=event["text"])
+
+    @database_sync_to_async
+    def is_participant(self, user, room_id):
+        return str(room_id).isdigit() and ChatRoom.objects.filter(id=room_id, participants=user).exists()
+
+    @database_sync_to_async
+    def get_backfill(self, room_id, last_seen_id):
+        if not settings.CHAT_WRITE_BEHIND:
+            messages, has_more = historial_mensajes(room_id, despues_de=last_seen_id, limite=MAX_LIMITE_HISTORIAL)
+            return self.serializar_mensajes(messages), has_more
+
+        # Con escritura diferida, lo aún no volcado está en el stream
+        pendientes = mensajes_pendientes(room_id)
+        cursor = next((p for p in pendientes if p["id"] == last_seen_id), None)
+        if cursor:
+            messages = [p for p in pendientes if (p["created_at"], p["id"]) > (cursor["created_at"], cursor["id"])]
+        else:
+            messages, has_more = historial_mensajes(room_id, despues_de=last_seen_id, limite=MAX_LIMITE_HISTORIAL)
+            messages = self.serializar_mensajes(messages)
+            if has_more:
+                return messages, True
+            volcados = {m["id"] for m in messages}
+            messages += [p for p in pendientes if p["id"] not in volcados]
+        return messages[:MAX_LIMITE_HISTORIAL], len(messages) > MAX_LIMITE_HISTORIAL
+
+    def serializar_mensajes(self, messages):
+        # Presencia de solo los remitentes de la página, en un único ZMSCORE
+        context = {"en_linea": presencia.en_linea({m.sender_id for m in messages})}
+        return MessageSerializer(messages, many=True, context=context).data
 
     @database_sync_to_async
-    def save_message(self, user, room_id, content):
-        room = ChatRoom.objects.get(id=room_id)
-        return Message.objects.create(room=room, sender=user, content=content)
+    def save_message(self, room_id, sender_id, content):
+        return insertar_mensaje(room_id, sender_id, content)
 
 
 class PostConsumer(AsyncWebsocketConsumer):
@@ -104,86 +235,113 @@ class PostConsumer(AsyncWebsocketConsumer):
         # Leave posts group
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
+    # Los eventos llegan ya serializados (evento_ws): se reenvían sin re-codificar
     async def post_update(self, event):
-        # Send post update to WebSocket
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "post_update",
-                    "action": event["action"],
-                    "post": event["post"],
-                }
-            )
-        )
+        await self.send(text_data=event["text"])
 
     async def comment_update(self, event):
-        # Send comment update to WebSocket
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "comment_update",
-                    "action": event["action"],
-                    "comment": event["comment"],
-                }
-            )
-        )
+        await self.send(text_data=event["text"])
+
 
 class OnlineStatusConsumer(AsyncWebsocketConsumer):
+    """
+    Presencia de los contactos del usuario (participantes de sus salas):
+      - al conectar: { "type": "presence_snapshot", "users": [...] }
+      - luego, cada PRESENCIA_INTERVALO segundos como mucho:
+        { "type": "presence_diff", "online": [ids], "offline": [ids] }
+    El cliente puede enviar { "type": "resync" } tras abrir una sala nueva.
+    """
+
     async def connect(self):
         user = self.scope["user"]
-        if user.is_authenticated:
-            await self.update_user_online_status(user, True)
-
-            # Join al grupo general
-            await self.channel_layer.group_add("online_users", self.channel_name)
-
-            # Avisar a todos que este user se conectó
-            await self.channel_layer.group_send(
-                "online_users",
-                {
-                    "type": "user_status",
-                    "user": {
-                        "id": user.id,
-                        "username": user.username,
-                        "avatar": user.avatar.url if hasattr(user, "avatar") and user.avatar else None,
-                        "is_online": True,
-                    },
-                },
-            )
+        self.heartbeat_task = None
+        self.diff_task = None
+        self.contactos = {}
+        self.grupos = set()
+        self.pendientes = {}
 
         await self.accept()
+        if not user.is_authenticated:
+            return
+
+        await self.sync_contacts()
+
+        # Solo se publica si es la primera conexión del usuario (otras pestañas no cuentan)
+        if await presencia.conectar(user.id, self.channel_name):
+            presencia.publicar_cambio(user.id, True)
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
 
     async def disconnect(self, close_code):
         user = self.scope["user"]
-        if user.is_authenticated:
-            await self.update_user_online_status(user, False)
-
-            # Salir del grupo
-            await self.channel_layer.group_discard("online_users", self.channel_name)
-
-            # Avisar que se desconectó
-            await self.channel_layer.group_send(
-                "online_users",
-                {
-                    "type": "user_status",
-                    "user": {
-                        "id": user.id,
-                        "username": user.username,
-                        "avatar": user.avatar.url if hasattr(user, "avatar") and user.avatar else None,
-                        "is_online": False,
-                    },
-                },
-            )
-
-    async def user_status(self, event):
+        if not user.is_authenticated:
+            return
+
+        for task in (self.heartbeat_task, self.diff_task):
+            if task:
+                task.cancel()
+        for grupo in self.grupos:
+            await self.channel_layer.group_discard(grupo, self.channel_name)
+
+        # Se publica la desconexión si era su última conexión
+        if await presencia.desconectar(user.id, self.channel_name):
+            presencia.publicar_cambio(user.id, False)
+
+    async def receive(self, text_data):
+        if json.loads(text_data).get("type") == "resync" and self.scope["user"].is_authenticated:
+            await self.sync_contacts()
+
+    async def sync_contacts(self):
+        """
+        Carga los contactos, ajusta los shards a los que está unida la conexión
+        y envía el snapshot de su presencia.
+        """
+        self.contactos = await database_sync_to_async(presencia.contactos)(self.scope["user"].id)
+        grupos = {presencia.grupo_shard(user_id) for user_id in self.contactos}
+        for grupo in grupos - self.grupos:
+            await self.channel_layer.group_add(grupo, self.channel_name)
+        for grupo in self.grupos - grupos:
+            await self.channel_layer.group_discard(grupo, self.channel_name)
+        self.grupos = grupos
+
+        en_linea = await presencia.en_linea_async(self.contactos)
+        self.pendientes = {}
         await self.send(
             text_data=json.dumps({
-                "type": "user_status",
-                "user": event["user"],
+                "type": "presence_snapshot",
+                "users": [
+                    {**payload, "is_online": user_id in en_linea}
+                    for user_id, payload in self.contactos.items()
+                ],
             })
         )
 
-    @database_sync_to_async
-    def update_user_online_status(self, user, is_online):
-        user.is_online = is_online
-        user.save(update_fields=["is_online"])
+    async def heartbeat(self):
+        # Renueva el vencimiento de la conexión; si el worker cae, la presencia vence sola
+        user_id = self.scope["user"].id
+        while True:
+            await asyncio.sleep(presencia.PRESENCIA_HEARTBEAT)
+            if await presencia.conectar(user_id, self.channel_name):
+                presencia.publicar_cambio(user_id, True)
+
+    async def presence_batch(self, event):
+        # Lote de un shard: se queda con los contactos y se envía un diff por ventana
+        for clave, is_online in (("online", True), ("offline", False)):
+            for user_id in event[clave]:
+                if user_id in self.contactos:
+                    self.pendientes[user_id] = is_online
+        if self.pendientes and self.diff_task is None:
+            self.diff_task = asyncio.create_task(self.send_diff())
+
+    async def send_diff(self):
+        await asyncio.sleep(presencia.PRESENCIA_INTERVALO)
+        pendientes, self.pendientes = self.pendientes, {}
+        self.diff_task = None
+        if not pendientes:
+            return
+        await self.send(
+            text_data=json.dumps({
+                "type": "presence_diff",
+                "online": [user_id for user_id, is_online in pendientes.items() if is_online],
+                "offline": [user_id for user_id, is_online in pendientes.items() if not is_online],
+            })
+        )
@@ -0,0 +1,351 @@
+# apps/comunidad/escritura_diferida.py
+"""
+Escritura diferida (write-behind) de mensajes de chat.
+
+Con CHAT_WRITE_BEHIND activo, ChatConsumer asigna id y fecha en el servidor, agrega
+el mensaje al stream de Redis STREAM_MENSAJES (y a un índice por sala, para leer
+lo pendiente de una sala sin recorrer el stream) y lo difunde sin esperar a Postgres.
+El comando `volcar_mensajes_chat` lee el stream con un consumer group y lo inserta
+en lotes; el id del mensaje es la clave de idempotencia (ON CONFLICT DO NOTHING),
+así una entrada reentregada tras una caída nunca se duplica. Una entrada que no se
+puede insertar por su contenido pasa a STREAM_DESCARTADOS en vez de bloquear el stream.
+"""
+import json
+from collections import deque
+
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import InterfaceError, OperationalError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .conexion_redis import redis_async, redis_sync
+from .models import ChatRoom, LecturaChat, Message
+from .utils import marcar_leido
+
+User = get_user_model()
+
+STREAM_MENSAJES = "comunidad:mensajes"
+STREAM_DESCARTADOS = "comunidad:mensajes:descartados"
+MAX_DESCARTADOS = 10000
+GRUPO_VOLCADO = "volcado"
+# Reintentos de un mismo frame (client_id) dentro de esta ventana reciben el mismo id
+TTL_CLIENT_ID = 60 * 60
+# Ids que cada proceso reserva de la secuencia de Message por consulta
+BLOQUE_IDS = 500
+# El índice por sala solo guarda lo no volcado; el TTL cubre salas que quedaron sin volcador
+TTL_INDICE_SALA = 24 * 60 * 60
+
+_ids_reservados = deque()
+
+
+def _clave_sala(room_id):
+    # Hash message_id -> payload de los mensajes de la sala que siguen en el stream
+    return f"comunidad:mensajes:sala:{room_id}"
+
+
+def _clave_lecturas(room_id):
+    # Hash user_id -> message_id de lecturas hasta un mensaje que aún no se volcó
+    return f"comunidad:chat:lecturas:{room_id}"
+
+
+# Reclama el client_id (si viene KEYS[3]) y encola en stream e índice de la sala, todo
+# o nada. Si el client_id ya estaba reclamado devuelve su id y no encola.
+_ENCOLAR = """
+if KEYS[3] then
+    local previo = redis.call('GET', KEYS[3])
+    if previo then
+        return previo
+    end
+    redis.call('SET', KEYS[3], ARGV[1], 'EX', ARGV[4])
+end
+redis.call('XADD', KEYS[1], '*', 'room_id', ARGV[2], 'message_id', ARGV[1], 'payload', ARGV[3])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return ARGV[1]
+"""
+_script_encolar = None
+
+# Borra el campo solo si nadie lo cambió desde que se leyó
+_BORRAR_SI_IGUAL = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+# ============================
+#   PRODUCTOR (ChatConsumer)
+# ============================
+def reservar_ids(cantidad=BLOQUE_IDS):
+    """
+    Reserva `cantidad` valores de la secuencia de Message.id: son pks reales, así
+    los mensajes diferidos conviven con los creados por el ORM.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            [Message._meta.db_table, cantidad],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+async def siguiente_id():
+    # Solo toca Postgres una vez cada BLOQUE_IDS mensajes por proceso
+    if not _ids_reservados:
+        _ids_reservados.extend(await database_sync_to_async(reservar_ids)())
+    return _ids_reservados.popleft()
+
+
+async def encolar_mensaje(room_id, sender, content, client_id=None):
+    """
+    Asigna id y fecha, y agrega el mensaje al stream. Devuelve (payload, nuevo):
+    si `client_id` ya se había recibido de este remitente, devuelve el id asignado
+    entonces con nuevo=False y no vuelve a encolar nada. La reserva del client_id
+    y el encolado van en un solo script: nunca queda un id reconocido sin encolar.
+    """
+    # Postgres no admite NUL en columnas text: el volcado fallaría para siempre
+    content = content.replace("\x00", "")
+    cliente = redis_async()
+
+    claves = [STREAM_MENSAJES, _clave_sala(room_id)]
+    if client_id:
+        clave = f"comunidad:chat:cliente:{sender['id']}:{client_id}"
+        # Un reintento no consume ids reservados; si la clave venció, se encola de nuevo
+        previo = await cliente.get(clave)
+        if previo is not None:
+            return {"id": int(previo), "client_id": client_id}, False
+        claves.append(clave)
+
+    message_id = await siguiente_id()
+    payload = {
+        "id": message_id,
+        "content": content,
+        "sender": sender,
+        "created_at": timezone.now().isoformat(),
+        "client_id": client_id,
+    }
+    datos = json.dumps(payload)
+
+    global _script_encolar
+    if _script_encolar is None:
+        _script_encolar = cliente.register_script(_ENCOLAR)
+    asignado = int(await _script_encolar(
+        keys=claves, args=[message_id, room_id, datos, TTL_CLIENT_ID, TTL_INDICE_SALA]
+    ))
+    if asignado != message_id:
+        # Otro intento con el mismo client_id ganó entre el GET y el script
+        return {"id": asignado, "client_id": client_id}, False
+    return payload, True
+
+
+def mensajes_pendientes(room_id):
+    """
+    Mensajes de la sala que siguen en el stream (aún no volcados), en el formato
+    difundido y en orden cronológico. Lee solo el índice de la sala, no el stream.
+    """
+    pendientes = [json.loads(datos) for datos in redis_sync().hvals(_clave_sala(room_id))]
+    pendientes.sort(key=lambda p: (p["created_at"], p["id"]))
+    return pendientes
+
+
+def diferir_lectura(room_id, user_id, message_id):
+    """
+    Guarda una lectura hasta un mensaje que sigue en el stream: el volcador la
+    aplica con marcar_leido() cuando inserta la sala (el volcado suma sin leer).
+    """
+    pipe = redis_sync().pipeline()
+    pipe.hset(_clave_lecturas(room_id), user_id, message_id)
+    pipe.expire(_clave_lecturas(room_id), TTL_INDICE_SALA)
+    pipe.execute()
+
+
+# ============================
+#   VOLCADO A POSTGRES
+# ============================
+def volcar_mensajes(entradas):
+    """
+    Inserta en una transacción las entradas del stream ([(stream_id, campos)]) y
+    aplica a ChatRoom y LecturaChat solo las filas realmente insertadas, así un
+    lote reentregado no cuenta dos veces. Las entradas de salas o usuarios ya
+    eliminados se descartan. Devuelve la cantidad de mensajes insertados.
+    """
+    filas = []
+    for _, campos in entradas:
+        payload = json.loads(campos["payload"])
+        filas.append((
+            payload["id"],
+            int(campos["room_id"]),
+            payload["sender"]["id"],
+            payload["content"],
+            parse_datetime(payload["created_at"]),
+        ))
+    if not filas:
+        return 0
+
+    qn = connection.ops.quote_name
+    ids, rooms, senders, contents, fechas = (list(columna) for columna in zip(*filas))
+    ahora = timezone.now()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {qn(Message._meta.db_table)} (id, room_id, sender_id, content, created_at, is_read)
+            SELECT v.id, v.room_id, v.sender_id, v.content, v.created_at, FALSE
+            FROM unnest(%s::bigint[], %s::bigint[], %s::bigint[], %s::text[], %s::timestamptz[])
+                 AS v(id, room_id, sender_id, content, created_at)
+            WHERE EXISTS (SELECT 1 FROM {qn(ChatRoom._meta.db_table)} r WHERE r.id = v.room_id)
+              AND EXISTS (SELECT 1 FROM {qn(User._meta.db_table)} u WHERE u.id = v.sender_id)
+            ON CONFLICT (id) DO NOTHING
+            RETURNING id, room_id, sender_id, created_at
+            """,
+            [ids, rooms, senders, contents, fechas],
+        )
+        insertados = sorted(cursor.fetchall(), key=lambda fila: (fila[3], fila[0]))
+        if not insertados:
+            return 0
+
+        # Mismo efecto que registrar_mensaje() aplicado al lote completo
+        por_sala = {}
+        for message_id, room_id, sender_id, created_at in insertados:
+            por_sala.setdefault(room_id, []).append((message_id, sender_id, created_at))
+
+        salas, totales, ultimas = [], [], []
+        lect_rooms, lect_users, lect_pendientes, lect_ultimos = [], [], [], []
+        for room_id, mensajes in por_sala.items():
+            salas.append(room_id)
+            totales.append(len(mensajes))
+            ultimas.append(mensajes[-1][2])
+            # Cada remitente queda al día hasta su último mensaje del lote
+            ultimo_propio = {}
+            for posicion, (message_id, sender_id, _) in enumerate(mensajes):
+                ultimo_propio[sender_id] = (posicion, message_id)
+            for sender_id, (posicion, message_id) in ultimo_propio.items():
+                lect_rooms.append(room_id)
+                lect_users.append(sender_id)
+                lect_pendientes.append(len(mensajes) - posicion - 1)
+                lect_ultimos.append(message_id)
+
+        cursor.execute(
+            f"""
+            UPDATE {qn(ChatRoom._meta.db_table)} r
+            SET updated_at = GREATEST(r.updated_at, v.ultima)
+            FROM unnest(%s::bigint[], %s::timestamptz[]) AS v(room_id, ultima)
+            WHERE r.id = v.room_id
+            """,
+            [salas, ultimas],
+        )
+        cursor.execute(
+            f"""
+            UPDATE {qn(LecturaChat._meta.db_table)} l
+            SET unread_count = l.unread_count + v.total, updated_at = %s
+            FROM unnest(%s::bigint[], %s::int[]) AS v(room_id, total)
+            WHERE l.room_id = v.room_id
+            """,
+            [ahora, salas, totales],
+        )
+        cursor.execute(
+            f"""
+            UPDATE {qn(LecturaChat._meta.db_table)} l
+            SET unread_count = v.pendientes, last_read_message_id = v.ultimo, updated_at = %s
+            FROM unnest(%s::bigint[], %s::bigint[], %s::int[], %s::bigint[])
+                 AS v(room_id, user_id, pendientes, ultimo)
+            WHERE l.room_id = v.room_id AND l.user_id = v.user_id
+            """,
+            [ahora, lect_rooms, lect_users, lect_pendientes, lect_ultimos],
+        )
+    return len(insertados)
+
+
+def leer_lote(cliente, consumidor, tamano, bloqueo_ms, inactividad_ms):
+    """
+    Próximo lote del consumer group: primero reclama entradas que otro volcador
+    dejó sin confirmar por más de `inactividad_ms` (caída a mitad de lote) y, si
+    no hay, lee entradas nuevas esperando hasta `bloqueo_ms`.
+    """
+    _, reclamadas, _ = cliente.xautoclaim(
+        STREAM_MENSAJES, GRUPO_VOLCADO, consumidor, min_idle_time=inactividad_ms, count=tamano
+    )
+    if reclamadas:
+        return reclamadas
+    respuesta = cliente.xreadgroup(
+        GRUPO_VOLCADO, consumidor, {STREAM_MENSAJES: ">"}, count=tamano, block=bloqueo_ms
+    )
+    return respuesta[0][1] if respuesta else []
+
+
+def volcar_lote(cliente, entradas):
+    """
+    Vuelca y confirma un lote. Si falla por su contenido (no por la conexión), reintenta
+    entrada por entrada y mueve a STREAM_DESCARTADOS, con el error, las que vuelven a
+    fallar. Ante una caída de la base relanza la excepción sin confirmar: el lote se
+    reclama después. Devuelve (insertados, descartados).
+    """
+    try:
+        insertados, descartados = volcar_mensajes(entradas), 0
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception:
+        insertados, descartados = 0, 0
+        for stream_id, campos in entradas:
+            try:
+                insertados += volcar_mensajes([(stream_id, campos)])
+            except (OperationalError, InterfaceError):
+                raise
+            except Exception as e:
+                cliente.xadd(
+                    STREAM_DESCARTADOS,
+                    {**campos, "stream_id": stream_id, "error": repr(e)[:500]},
+                    maxlen=MAX_DESCARTADOS,
+                    approximate=True,
+                )
+                descartados += 1
+    confirmar_lote(cliente, entradas)
+    aplicar_lecturas_diferidas(cliente, {campos.get("room_id") for _, campos in entradas})
+    return insertados, descartados
+
+
+def aplicar_lecturas_diferidas(cliente, room_ids):
+    """
+    Aplica las lecturas diferidas de esas salas cuyo mensaje ya está en Postgres.
+    """
+    for room_id in room_ids:
+        clave = _clave_lecturas(room_id)
+        diferidas = cliente.hgetall(clave)
+        if not diferidas or not str(room_id).isdigit():
+            continue
+        room = ChatRoom.objects.filter(id=room_id).first()
+        if room is None:
+            cliente.delete(clave)
+            continue
+
+        volcados = set(
+            Message.objects.filter(room=room, id__in=[int(m) for m in diferidas.values()])
+            .values_list("id", flat=True)
+        )
+        usuarios = User.objects.in_bulk([int(u) for u in diferidas])
+        for user_id, message_id in diferidas.items():
+            if int(message_id) not in volcados:
+                continue
+            if int(user_id) in usuarios:
+                marcar_leido(room, usuarios[int(user_id)], int(message_id))
+            cliente.eval(_BORRAR_SI_IGUAL, 1, clave, user_id, message_id)
+
+
+def confirmar_lote(cliente, entradas):
+    # Confirmadas y eliminadas: el stream y los índices por sala solo conservan lo que falta volcar
+    ids = [stream_id for stream_id, _ in entradas]
+    if not ids:
+        return
+    por_sala = {}
+    for _, campos in entradas:
+        if campos.get("message_id"):
+            por_sala.setdefault(campos.get("room_id"), []).append(campos["message_id"])
+
+    pipe = cliente.pipeline()
+    pipe.xack(STREAM_MENSAJES, GRUPO_VOLCADO, *ids)
+    pipe.xdel(STREAM_MENSAJES, *ids)
+    for room_id, message_ids in por_sala.items():
+        pipe.hdel(_clave_sala(room_id), *message_ids)
+    pipe.execute()
@@ -0,0 +1,51 @@
+import socket
+
+from django.core.management.base import BaseCommand
+from redis.exceptions import ResponseError
+
+from comunidad.conexion_redis import redis_sync
+from comunidad.escritura_diferida import (
+    GRUPO_VOLCADO,
+    STREAM_DESCARTADOS,
+    STREAM_MENSAJES,
+    leer_lote,
+    volcar_lote,
+)
+
+
+class Command(BaseCommand):
+    help = "Vuelca a la base de datos los mensajes de chat encolados en Redis (CHAT_WRITE_BEHIND)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=500, help="Mensajes por inserción.")
+        parser.add_argument("--bloqueo", type=int, default=1000, help="Espera máxima por lote (ms).")
+        parser.add_argument(
+            "--inactividad", type=int, default=60000,
+            help="Tiempo sin confirmar tras el cual se reclaman entradas de otro volcador (ms).",
+        )
+        parser.add_argument("--una-vez", action="store_true", help="Vuelca lo pendiente y termina.")
+
+    def handle(self, *args, **options):
+        cliente = redis_sync()
+        consumidor = f"{socket.gethostname()}-{id(self)}"
+        try:
+            cliente.xgroup_create(STREAM_MENSAJES, GRUPO_VOLCADO, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+        total = 0
+        while True:
+            entradas = leer_lote(
+                cliente, consumidor, options["lote"], options["bloqueo"], options["inactividad"]
+            )
+            if entradas:
+                # Solo se confirma tras el commit; si la base cae, el lote se reclama después
+                insertados, descartados = volcar_lote(cliente, entradas)
+                total += insertados
+                if descartados:
+                    self.stderr.write(f"{descartados} mensajes descartados a {STREAM_DESCARTADOS}.")
+            elif options["una_vez"]:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"{total} mensajes volcados."))
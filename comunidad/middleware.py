@@ -1,34 +1,73 @@
 # comunidad/middleware.py
+import time
+from collections import OrderedDict
+
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth import get_user_model
+from django.http.cookie import parse_cookie
 
-from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.exceptions import ExpiredTokenError, TokenError
 
 User = get_user_model()
 
+# Cierre que indica al cliente que renueve el access token antes de reconectar
+CLOSE_TOKEN_EXPIRADO = 4401
+# Segundos que un usuario resuelto se reutiliza entre handshakes del mismo proceso
+PRINCIPAL_TTL = 60
+MAX_PRINCIPALES = 10000
+
+_principales = OrderedDict()
+
 
 @database_sync_to_async
-def get_user_from_jwt(token_str):
+def get_user(user_id):
+    return User.objects.filter(id=user_id, is_active=True).first()
+
+
+async def get_principal(user_id):
     """
-    Valida el token con Simple JWT y devuelve el usuario.
+    Usuario del token desde la caché del proceso (TTL corto) o, si no está o
+    venció, desde la base de datos. Tras un deploy, la ola de reconexiones de un
+    mismo usuario (varias pestañas y sockets) consulta una sola vez.
     """
-    try:
-        # Valida el token con SimpleJWT (firma, expiración, etc.)
-        validated_token = UntypedToken(token_str)
-        user_id = validated_token.get("user_id")
+    ahora = time.monotonic()
+    entrada = _principales.get(user_id)
+    if entrada and entrada[1] > ahora:
+        _principales.move_to_end(user_id)
+        return entrada[0]
+
+    user = await get_user(user_id)
+    if user is None:
+        _principales.pop(user_id, None)
+        return AnonymousUser()
 
-        if user_id:
-            return User.objects.get(id=user_id)
-    except (TokenError, User.DoesNotExist):
-        pass
-    return AnonymousUser()
+    _principales[user_id] = (user, ahora + PRINCIPAL_TTL)
+    _principales.move_to_end(user_id)
+    while len(_principales) > MAX_PRINCIPALES:
+        _principales.popitem(last=False)
+    return user
+
+
+def validar_token(token_str):
+    """
+    Valida el access token una sola vez (firma, tipo y expiración).
+    Devuelve (user_id, expirado).
+    """
+    try:
+        return AccessToken(token_str).get("user_id"), False
+    except ExpiredTokenError:
+        # La firma es válida y solo venció: el cliente debe renovar el token
+        return None, True
+    except TokenError:
+        return None, False
 
 
 class JwtAuthMiddleware:
     """
     Middleware que autentica al usuario en WebSocket usando un JWT en cookie httponly.
+    Si el token venció, acepta y cierra el handshake con CLOSE_TOKEN_EXPIRADO.
     """
 
     def __init__(self, inner):
@@ -38,22 +77,21 @@ class JwtAuthMiddleware:
         scope["user"] = AnonymousUser()
 
         # Buscar cookie "access_token"
-        cookie_header = next(
-            (value for name, value in scope.get("headers", []) if name == b"cookie"),
-            None,
-        )
-
-        if cookie_header:
-            cookie_string = cookie_header.decode()
-            token = None
-            for cookie in cookie_string.split(";"):
-                cookie_name, *cookie_value = cookie.split("=", 1)
-                if cookie_name.strip() == "access_token":
-                    token = cookie_value[0].strip()
-                    break
-
-            if token:
-                scope["user"] = await get_user_from_jwt(token)
-                print(f"[JwtAuthMiddleware] Usuario autenticado: {scope['user']}")
+        cookie_header = b"; ".join(value for name, value in scope.get("headers", []) if name == b"cookie")
+        token = parse_cookie(cookie_header.decode("latin-1")).get("access_token") if cookie_header else None
+
+        if token:
+            user_id, expirado = validar_token(token)
+            if expirado:
+                return await self.cerrar_expirado(receive, send)
+            if user_id:
+                scope["user"] = await get_principal(user_id)
 
         return await self.inner(scope, receive, send)
+
+    async def cerrar_expirado(self, receive, send):
+        # Un close antes del accept llega al cliente como un 403 sin código
+        mensaje = await receive()
+        if mensaje["type"] == "websocket.connect":
+            await send({"type": "websocket.accept"})
+            await send({"type": "websocket.close", "code": CLOSE_TOKEN_EXPIRADO})
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def crear_lecturas(apps, schema_editor):
+    """
+    Una LecturaChat por participante, con los no leídos que marca Message.is_read
+    y como último leído el mensaje más reciente propio o ya leído.
+    """
+    ChatRoom = apps.get_model("comunidad", "ChatRoom")
+    Message = apps.get_model("comunidad", "Message")
+    LecturaChat = apps.get_model("comunidad", "LecturaChat")
+
+    participantes = ChatRoom.participants.through.objects.values_list("chatroom_id", "user_id")
+    lecturas = []
+    for room_id, user_id in participantes.iterator():
+        resumen = Message.objects.filter(room_id=room_id).aggregate(
+            no_leidos=Count("id", filter=Q(is_read=False) & ~Q(sender_id=user_id)),
+            ultimo_leido=Max("id", filter=Q(is_read=True) | Q(sender_id=user_id)),
+        )
+        lecturas.append(
+            LecturaChat(
+                room_id=room_id,
+                user_id=user_id,
+                unread_count=resumen["no_leidos"],
+                last_read_message_id=resumen["ultimo_leido"],
+            )
+        )
+    LecturaChat.objects.bulk_create(lecturas, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comunidad', '0003_delete_userprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LecturaChat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_read_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='comunidad.message')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecturas', to='comunidad.chatroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecturas_chat', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'user'), name='lectura_chat_unica')],
+            },
+        ),
+        migrations.RunPython(crear_lecturas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def contar_comentarios(apps, schema_editor):
+    Post = apps.get_model("comunidad", "Post")
+    Comment = apps.get_model("comunidad", "Comment")
+
+    totales = (
+        Comment.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    Post.objects.update(comments_count=Coalesce(Subquery(totales, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comunidad', '0005_message_room_created_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created_at', 'id'], name='post_feed_idx'),
+        ),
+        migrations.RunPython(contar_comentarios, migrations.RunPython.noop),
+    ]
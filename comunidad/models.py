@@ -13,9 +13,14 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalizado: se mantiene con F() al crear/borrar comentarios (signals)
+    comments_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="post_feed_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -31,6 +36,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # Últimos comentarios por post (feed) e hilo paginado
+            models.Index(fields=["post", "created_at", "id"], name="comment_post_created_id"),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
@@ -65,11 +74,40 @@ class Message(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # Historial por cursor y último mensaje del inbox
+            models.Index(fields=["room", "created_at", "id"], name="message_room_created_id"),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} in {self.room}"
 
 
+class LecturaChat(models.Model):
+    """
+    Estado de lectura de un participante en una sala (modelo de lectura del inbox).
+    unread_count se incrementa al guardar un mensaje de otro participante y vuelve
+    a cero al marcar la sala como leída; así el inbox no cuenta mensajes por sala.
+    """
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name="lecturas")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="lecturas_chat"
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_message = models.ForeignKey(
+        Message, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["room", "user"], name="lectura_chat_unica"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} en {self.room}: {self.unread_count} sin leer"
+
+
 
 class PostImage(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='images')
@@ -0,0 +1,220 @@
+# apps/comunidad/presencia.py
+"""
+Presencia de usuarios en Redis (nunca en la base de datos).
+
+- CLAVE_EN_LINEA: sorted set user_id → instante (epoch) en que vence su presencia.
+  Un usuario está en línea si su score es mayor que ahora.
+- comunidad:presencia:conexiones:<user_id>: sorted set canal → vencimiento, una
+  entrada por conexión WebSocket (conteo de referencias entre pestañas).
+
+Cada conexión renueva su vencimiento con heartbeats; si el worker cae, deja de
+renovar y el usuario vence solo tras PRESENCIA_TTL segundos. La tarea periódica
+barrer_presencia_vencida (Celery beat) lo quita del set y publica su offline.
+
+Los cambios se difunden solo a los contactos (participantes de sus salas de chat):
+cada proceso junta los cambios de PRESENCIA_INTERVALO segundos y los publica por
+shard (grupo presencia_<user_id % PRESENCIA_SHARDS>); cada suscriptor se une a los
+shards de sus contactos y filtra.
+"""
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+
+from .conexion_redis import redis_async, redis_sync
+
+User = get_user_model()
+
+CLAVE_EN_LINEA = "comunidad:presencia"
+PRESENCIA_TTL = 90
+PRESENCIA_HEARTBEAT = 30
+PRESENCIA_SHARDS = 32
+PRESENCIA_INTERVALO = 2
+
+# Devuelve 1 si el usuario pasó a estar en línea
+_CONECTAR = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+local previo = redis.call('ZSCORE', KEYS[2], ARGV[4])
+redis.call('ZADD', KEYS[2], 'GT', ARGV[3], ARGV[4])
+if previo and tonumber(previo) > tonumber(ARGV[2]) then
+    return 0
+end
+return 1
+"""
+
+# Devuelve 1 si era la última conexión viva del usuario
+_DESCONECTAR = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    redis.call('DEL', KEYS[1])
+    return redis.call('ZREM', KEYS[2], ARGV[3])
+end
+return 0
+"""
+
+# Quita y devuelve (hasta ARGV[2]) los usuarios vencidos; atómico frente a un heartbeat
+_VENCIDOS = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #ids > 0 then
+    redis.call('ZREM', KEYS[1], unpack(ids))
+end
+return ids
+"""
+
+_scripts = {}
+_cambios = {}
+_tarea_publicacion = None
+
+
+def _clave_conexiones(user_id):
+    return f"comunidad:presencia:conexiones:{user_id}"
+
+
+def _script(nombre, fuente):
+    if nombre not in _scripts:
+        _scripts[nombre] = redis_async().register_script(fuente)
+    return _scripts[nombre]
+
+
+# ============================
+#   CONEXIONES (consumers)
+# ============================
+async def conectar(user_id, canal):
+    """
+    Registra (o renueva, en cada heartbeat) una conexión del usuario.
+    Devuelve True si el usuario no estaba en línea.
+    """
+    ahora = time.time()
+    resultado = await _script("conectar", _CONECTAR)(
+        keys=[_clave_conexiones(user_id), CLAVE_EN_LINEA],
+        args=[canal, ahora, ahora + PRESENCIA_TTL, user_id, PRESENCIA_TTL * 2],
+    )
+    return bool(resultado)
+
+
+async def desconectar(user_id, canal):
+    """
+    Quita una conexión del usuario. Devuelve True si era la última.
+    """
+    resultado = await _script("desconectar", _DESCONECTAR)(
+        keys=[_clave_conexiones(user_id), CLAVE_EN_LINEA],
+        args=[canal, time.time(), user_id],
+    )
+    return bool(resultado)
+
+
+# ============================
+#   LECTURAS
+# ============================
+def usuarios_en_linea():
+    """
+    Ids de todos los usuarios en línea, en una sola lectura (solo para listar a
+    todos; para un conjunto conocido de usuarios usar en_linea()).
+    """
+    return {int(user_id) for user_id in redis_sync().zrangebyscore(CLAVE_EN_LINEA, time.time(), "+inf")}
+
+
+def _filtrar_en_linea(user_ids, scores):
+    ahora = time.time()
+    return {user_id for user_id, score in zip(user_ids, scores) if score and score > ahora}
+
+
+def en_linea(user_ids):
+    """
+    Subconjunto de `user_ids` en línea (un solo ZMSCORE).
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+    return _filtrar_en_linea(user_ids, redis_sync().zmscore(CLAVE_EN_LINEA, user_ids))
+
+
+async def en_linea_async(user_ids):
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+    return _filtrar_en_linea(user_ids, await redis_async().zmscore(CLAVE_EN_LINEA, user_ids))
+
+
+# ============================
+#   DIFUSIÓN A CONTACTOS
+# ============================
+def grupo_shard(user_id):
+    return f"presencia_{int(user_id) % PRESENCIA_SHARDS}"
+
+
+def _por_shard(cambios):
+    por_grupo = {}
+    for user_id, is_online in cambios.items():
+        diff = por_grupo.setdefault(grupo_shard(user_id), {"online": [], "offline": []})
+        diff["online" if is_online else "offline"].append(user_id)
+    return por_grupo
+
+
+def contactos(user_id):
+    """
+    {id: payload} de los usuarios que comparten alguna sala de chat con user_id.
+    """
+    usuarios = (
+        User.objects.filter(chat_rooms__participants=user_id)
+        .exclude(id=user_id)
+        .distinct()
+        .only("id", "username", "avatar")
+    )
+    return {
+        u.id: {"id": u.id, "username": u.username, "avatar": u.avatar.url if u.avatar else None}
+        for u in usuarios
+    }
+
+
+def publicar_cambio(user_id, is_online):
+    """
+    Encola el cambio de estado; un solo envío por shard cada PRESENCIA_INTERVALO
+    segundos y por proceso, aunque se conecten miles de usuarios a la vez.
+    Si un usuario cambia dos veces en la ventana, se publica el último estado.
+    """
+    global _tarea_publicacion
+    _cambios[user_id] = is_online
+    if _tarea_publicacion is None:
+        _tarea_publicacion = asyncio.create_task(_publicar_cambios())
+
+
+async def _publicar_cambios():
+    global _tarea_publicacion
+    await asyncio.sleep(PRESENCIA_INTERVALO)
+    cambios = dict(_cambios)
+    _cambios.clear()
+    # Los cambios que lleguen mientras se envía programan la próxima ventana
+    _tarea_publicacion = None
+
+    channel_layer = get_channel_layer()
+    for grupo, diff in _por_shard(cambios).items():
+        await channel_layer.group_send(grupo, {"type": "presence_batch", **diff})
+
+
+# ============================
+#   VENCIMIENTOS (Celery beat)
+# ============================
+def barrer_vencidos(lote=1000):
+    """
+    Quita de CLAVE_EN_LINEA a los usuarios cuya presencia venció sin desconectarse
+    (worker caído) y publica su offline por shard, como _publicar_cambios().
+    Devuelve los ids publicados.
+    """
+    cliente = redis_sync()
+    vencidos = []
+    while True:
+        ids = cliente.eval(_VENCIDOS, 1, CLAVE_EN_LINEA, time.time(), lote)
+        vencidos += [int(user_id) for user_id in ids]
+        if len(ids) < lote:
+            break
+
+    channel_layer = get_channel_layer()
+    for grupo, diff in _por_shard(dict.fromkeys(vencidos, False)).items():
+        async_to_sync(channel_layer.group_send)(grupo, {"type": "presence_batch", **diff})
+    return vencidos
@@ -1,13 +1,22 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Post, Comment, ChatRoom, Message
+from .presencia import en_linea
+from .models import Post, Comment, ChatRoom, Message, LecturaChat
 
 User = get_user_model()
 class UserComunidadSerializer(serializers.ModelSerializer):
+    is_online = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'avatar', 'is_online']
 
+    def get_is_online(self, obj):
+        # La vista pasa en el context 'en_linea' de los usuarios que va a mostrar (un ZMSCORE)
+        if 'en_linea' in self.context:
+            return obj.id in self.context['en_linea']
+        return obj.id in en_linea([obj.id])
+
 class CommentSerializer(serializers.ModelSerializer):
     author = UserComunidadSerializer(read_only=True)
     
@@ -19,15 +28,25 @@ class CommentSerializer(serializers.ModelSerializer):
 class PostSerializer(serializers.ModelSerializer):
     author = UserComunidadSerializer(read_only=True)
     comments = CommentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Post
         fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at', 'comments', 'comments_count']
-        read_only_fields = ['id', 'created_at', 'updated_at']
-    
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+        read_only_fields = ['id', 'created_at', 'updated_at', 'comments_count']
+
+
+class PostFeedSerializer(serializers.ModelSerializer):
+    """
+    Post del feed: solo los últimos comentarios (feed_posts los adjunta);
+    el hilo completo está en posts/<id>/comments/.
+    """
+    author = UserComunidadSerializer(read_only=True)
+    latest_comments = CommentSerializer(source='ultimos_comentarios', many=True, read_only=True)
+
+    class Meta:
+        model = Post
+        fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at', 'comments_count', 'latest_comments']
+        read_only_fields = fields
 
 class MessageSerializer(serializers.ModelSerializer):
     sender = UserComunidadSerializer(read_only=True)
@@ -48,11 +67,22 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_last_message(self, obj):
-        last_message = obj.messages.last()
+        # inbox_chat ya trae el último mensaje con su remitente
+        if hasattr(obj, "ultimo_mensaje"):
+            last_message = obj.ultimo_mensaje
+        else:
+            last_message = obj.messages.select_related("sender").order_by("-created_at", "-id").first()
         if last_message:
-            return MessageSerializer(last_message).data
+            return MessageSerializer(last_message, context=self.context).data
         return None
-    
+
     def get_unread_count(self, obj):
+        if hasattr(obj, "no_leidos"):
+            return obj.no_leidos
         user = self.context['request'].user
-        return obj.messages.filter(is_read=False).exclude(sender=user).count()
\ No newline at end of file
+        return (
+            LecturaChat.objects.filter(room=obj, user=user)
+            .values_list("unread_count", flat=True)
+            .first()
+            or 0
+        )
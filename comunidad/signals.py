@@ -0,0 +1,56 @@
+# apps/comunidad/signals.py
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ChatRoom, Comment, LecturaChat, Message, Post
+from .utils import asegurar_lecturas, registrar_mensaje
+
+
+# ============================
+#   ESTADO DE LECTURA DEL CHAT
+# ============================
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def sincronizar_lecturas(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if action == "post_add":
+        if reverse:
+            for room_id in pk_set or ():
+                asegurar_lecturas(room_id, [instance.pk])
+        else:
+            asegurar_lecturas(instance.pk, pk_set or ())
+        return
+
+    if reverse:
+        lecturas = LecturaChat.objects.filter(user_id=instance.pk)
+        if action == "post_remove":
+            lecturas = lecturas.filter(room_id__in=pk_set or ())
+    else:
+        lecturas = LecturaChat.objects.filter(room_id=instance.pk)
+        if action == "post_remove":
+            lecturas = lecturas.filter(user_id__in=pk_set or ())
+    lecturas.delete()
+
+
+@receiver(post_save, sender=Message)
+def actualizar_lecturas_mensaje(sender, instance, created, **kwargs):
+    if created:
+        registrar_mensaje(instance)
+
+
+# ============================
+#   CONTADOR DE COMENTARIOS
+# ============================
+@receiver(post_save, sender=Comment)
+def sumar_comentario(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(id=instance.post_id).update(comments_count=F("comments_count") + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def restar_comentario(sender, instance, **kwargs):
+    Post.objects.filter(id=instance.post_id, comments_count__gt=0).update(
+        comments_count=F("comments_count") - 1
+    )
@@ -0,0 +1,12 @@
+from celery import shared_task
+
+from . import presencia
+
+
+@shared_task
+def barrer_presencia_vencida():
+    """
+    Publica el offline de los usuarios cuya presencia venció por TTL (su worker cayó
+    sin desconectarlos) y los quita del set de presencia.
+    """
+    return len(presencia.barrer_vencidos())
@@ -0,0 +1,282 @@
+# apps/comunidad/utils.py
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F, Q, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from preparacion.utils import codificar_cursor, decodificar_cursor
+from .models import ChatRoom, Comment, LecturaChat, Message, Post
+
+
+# ============================
+#   DIFUSIÓN POR WEBSOCKET
+# ============================
+def evento_ws(tipo, **datos):
+    """
+    Evento para channel_layer.group_send con el frame ya serializado en "text":
+    se codifica una sola vez en el productor y cada consumer lo reenvía tal cual.
+    """
+    return {"type": tipo, "text": json.dumps({"type": tipo, **datos}, cls=DjangoJSONEncoder)}
+
+
+# ============================
+#   INBOX / ESTADO DE LECTURA
+# ============================
+def asegurar_lecturas(room_id, user_ids):
+    """
+    Crea (si faltan) las filas de LecturaChat de los participantes de una sala.
+    """
+    LecturaChat.objects.bulk_create(
+        [LecturaChat(room_id=room_id, user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def registrar_mensaje(message):
+    """
+    Aplica un mensaje nuevo al modelo de lectura: +1 sin leer para el resto de
+    participantes, el remitente queda al día y la sala sube en el inbox.
+    """
+    LecturaChat.objects.filter(room_id=message.room_id).exclude(user_id=message.sender_id).update(
+        unread_count=F("unread_count") + 1
+    )
+    LecturaChat.objects.filter(room_id=message.room_id, user_id=message.sender_id).update(
+        unread_count=0, last_read_message_id=message.id
+    )
+    # update() no aplica auto_now
+    ChatRoom.objects.filter(id=message.room_id).update(updated_at=message.created_at)
+
+
+def insertar_mensaje(room_id, sender_id, content):
+    """
+    Ruta de escritura del ChatConsumer: un único statement (CTE) que inserta el
+    mensaje, sube ChatRoom.updated_at y aplica registrar_mensaje() sobre LecturaChat.
+    No dispara post_save. Devuelve (id, created_at).
+    """
+    qn = connection.ops.quote_name
+    ahora = timezone.now()
+    sql = f"""
+        WITH nuevo AS (
+            INSERT INTO {qn(Message._meta.db_table)} (room_id, sender_id, content, created_at, is_read)
+            VALUES (%s, %s, %s, %s, FALSE)
+            RETURNING id, created_at
+        ), sala AS (
+            UPDATE {qn(ChatRoom._meta.db_table)} SET updated_at = %s WHERE id = %s
+        ), lecturas AS (
+            UPDATE {qn(LecturaChat._meta.db_table)}
+            SET unread_count = CASE WHEN user_id = %s THEN 0 ELSE unread_count + 1 END,
+                last_read_message_id = CASE
+                    WHEN user_id = %s THEN (SELECT id FROM nuevo) ELSE last_read_message_id
+                END,
+                updated_at = %s
+            WHERE room_id = %s
+        )
+        SELECT id, created_at FROM nuevo
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            [room_id, sender_id, content, ahora, ahora, room_id, sender_id, sender_id, ahora, room_id],
+        )
+        return cursor.fetchone()
+
+
+def marcar_leido(room, user, hasta_id=None):
+    """
+    Marca como leídos los mensajes de `room` hasta `hasta_id` (por defecto el último)
+    y deja en LecturaChat los que siguen sin leer después de ese mensaje.
+    El orden es (created_at, id), igual que el historial: con escritura diferida
+    los ids se reservan por bloques y no siguen el orden cronológico.
+    Devuelve la LecturaChat actualizada.
+    """
+    mensajes = Message.objects.filter(room=room)
+    posicion = mensajes.order_by("-created_at", "-id") if hasta_id is None else mensajes.filter(id=hasta_id)
+    hasta = posicion.values("created_at", "id").first()
+
+    with transaction.atomic():
+        lectura, _ = LecturaChat.objects.select_for_update().get_or_create(room=room, user=user)
+        if hasta is None:
+            return lectura
+        if lectura.last_read_message_id:
+            previo = mensajes.filter(id=lectura.last_read_message_id).values("created_at", "id").first()
+            if previo and (previo["created_at"], previo["id"]) >= (hasta["created_at"], hasta["id"]):
+                return lectura
+
+        hasta_aqui = Q(created_at__lt=hasta["created_at"]) | Q(created_at=hasta["created_at"], id__lte=hasta["id"])
+        de_otros = mensajes.exclude(sender=user)
+        de_otros.filter(hasta_aqui, is_read=False).update(is_read=True)
+        lectura.unread_count = de_otros.exclude(hasta_aqui).count()
+        lectura.last_read_message_id = hasta["id"]
+        lectura.save(update_fields=["unread_count", "last_read_message", "updated_at"])
+    return lectura
+
+
+def inbox_chat(user):
+    """
+    Salas del usuario ordenadas por última actividad, en un número fijo de consultas:
+    una con el estado de lectura y el último mensaje (LEFT JOIN LATERAL), otra con
+    esos mensajes y su remitente, y el prefetch de participantes.
+    Cada sala trae `no_leidos`, `ultimo_leido_id` y `ultimo_mensaje`.
+    """
+    qn = connection.ops.quote_name
+    participantes = ChatRoom.participants.through._meta.db_table
+    sql = f"""
+        SELECT r.*,
+               COALESCE(l.unread_count, 0) AS no_leidos,
+               l.last_read_message_id AS ultimo_leido_id,
+               u.id AS ultimo_mensaje_id
+        FROM {qn(ChatRoom._meta.db_table)} r
+        JOIN {qn(participantes)} p ON p.chatroom_id = r.id AND p.user_id = %s
+        LEFT JOIN {qn(LecturaChat._meta.db_table)} l ON l.room_id = r.id AND l.user_id = %s
+        LEFT JOIN LATERAL (
+            SELECT m.id
+            FROM {qn(Message._meta.db_table)} m
+            WHERE m.room_id = r.id
+            ORDER BY m.created_at DESC, m.id DESC
+            LIMIT 1
+        ) u ON TRUE
+        ORDER BY r.updated_at DESC, r.id DESC
+    """
+    salas = list(ChatRoom.objects.raw(sql, [user.id, user.id]))
+
+    ids = [sala.ultimo_mensaje_id for sala in salas if sala.ultimo_mensaje_id]
+    mensajes = Message.objects.select_related("sender").in_bulk(ids) if ids else {}
+    for sala in salas:
+        sala.ultimo_mensaje = mensajes.get(sala.ultimo_mensaje_id)
+
+    prefetch_related_objects(salas, "participants")
+    return salas
+
+
+# ============================
+#   HISTORIAL DE MENSAJES
+# ============================
+LIMITE_HISTORIAL = 50
+MAX_LIMITE_HISTORIAL = 200
+
+
+def historial_mensajes(room_id, antes_de=None, despues_de=None, limite=LIMITE_HISTORIAL):
+    """
+    Página de mensajes de una sala por cursor sobre (created_at, id), usando el
+    índice (room, created_at, id):
+      - antes_de: los `limite` mensajes anteriores a ese id (scroll hacia atrás).
+      - despues_de: los `limite` mensajes posteriores a ese id (backfill al reconectar).
+      - sin cursor: los `limite` más recientes.
+    Devuelve (mensajes en orden cronológico, hay_mas). Si el id del cursor no es
+    de la sala devuelve ([], False).
+    """
+    mensajes = Message.objects.filter(room_id=room_id).select_related("sender")
+    cursor_id = antes_de if antes_de is not None else despues_de
+    if cursor_id is not None:
+        cursor = mensajes.filter(id=cursor_id).values("created_at", "id").first()
+        if not cursor:
+            return [], False
+
+    if despues_de is not None:
+        mensajes = mensajes.filter(
+            Q(created_at__gt=cursor["created_at"]) | Q(created_at=cursor["created_at"], id__gt=cursor["id"])
+        ).order_by("created_at", "id")
+    else:
+        if antes_de is not None:
+            mensajes = mensajes.filter(
+                Q(created_at__lt=cursor["created_at"]) | Q(created_at=cursor["created_at"], id__lt=cursor["id"])
+            )
+        mensajes = mensajes.order_by("-created_at", "-id")
+
+    pagina = list(mensajes[: limite + 1])
+    hay_mas = len(pagina) > limite
+    pagina = pagina[:limite]
+    if despues_de is None:
+        pagina.reverse()
+    return pagina, hay_mas
+
+
+# ============================
+#   FEED DE PUBLICACIONES
+# ============================
+LIMITE_FEED = 20
+MAX_LIMITE_FEED = 50
+COMENTARIOS_PREVIEW = 3
+
+
+def _posicion_cursor(cursor):
+    """
+    (created_at, id) codificados en un cursor, o None si no es válido.
+    """
+    valores = decodificar_cursor(cursor)
+    if not valores:
+        return None
+    created_at = parse_datetime(str(valores[0]))
+    if not created_at or not str(valores[1]).isdigit():
+        return None
+    return created_at, int(valores[1])
+
+
+def feed_posts(cursor=None, limite=LIMITE_FEED, comentarios=COMENTARIOS_PREVIEW):
+    """
+    Página del feed por cursor sobre (created_at, id) descendente. Cada post trae
+    `ultimos_comentarios`: los `comentarios` más recientes en orden cronológico,
+    en una sola consulta con ROW_NUMBER() por post.
+    Devuelve (posts, next_cursor); lanza ValueError si el cursor no es válido.
+    """
+    posts = Post.objects.select_related("author").order_by("-created_at", "-id")
+    if cursor:
+        posicion = _posicion_cursor(cursor)
+        if not posicion:
+            raise ValueError("cursor inválido")
+        created_at, post_id = posicion
+        posts = posts.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=post_id))
+
+    pagina = list(posts[: limite + 1])
+    siguiente = None
+    if len(pagina) > limite:
+        pagina = pagina[:limite]
+        siguiente = codificar_cursor([pagina[-1].created_at.isoformat(), pagina[-1].id])
+
+    por_post = {post.id: [] for post in pagina}
+    if por_post and comentarios:
+        recientes = (
+            Comment.objects.filter(post_id__in=por_post)
+            .select_related("author")
+            .annotate(
+                posicion=Window(
+                    RowNumber(),
+                    partition_by=[F("post_id")],
+                    order_by=[F("created_at").desc(), F("id").desc()],
+                )
+            )
+            .filter(posicion__lte=comentarios)
+            .order_by("post_id", "created_at", "id")
+        )
+        for comentario in recientes:
+            por_post[comentario.post_id].append(comentario)
+    for post in pagina:
+        post.ultimos_comentarios = por_post[post.id]
+    return pagina, siguiente
+
+
+def comentarios_post(post_id, cursor=None, limite=LIMITE_FEED):
+    """
+    Hilo de comentarios de un post en orden cronológico, por cursor sobre (created_at, id).
+    Devuelve (comentarios, next_cursor); lanza ValueError si el cursor no es válido.
+    """
+    comentarios = Comment.objects.filter(post_id=post_id).select_related("author").order_by("created_at", "id")
+    if cursor:
+        posicion = _posicion_cursor(cursor)
+        if not posicion:
+            raise ValueError("cursor inválido")
+        created_at, comment_id = posicion
+        comentarios = comentarios.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=comment_id)
+        )
+
+    pagina = list(comentarios[: limite + 1])
+    siguiente = None
+    if len(pagina) > limite:
+        pagina = pagina[:limite]
+        siguiente = codificar_cursor([pagina[-1].created_at.isoformat(), pagina[-1].id])
+    return pagina, siguiente
@@ -2,7 +2,8 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.conf import settings
+from django.db.models import Prefetch, Q
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from .models import Post, Comment, ChatRoom, Message
@@ -11,30 +12,115 @@ from django.core.files.base import ContentFile
 
 from django.db.models import Count
 from .serializers import (
-    PostSerializer, CommentSerializer, ChatRoomSerializer,
+    PostSerializer, PostFeedSerializer, CommentSerializer, ChatRoomSerializer,
     MessageSerializer, UserComunidadSerializer
 )
+from .escritura_diferida import diferir_lectura, mensajes_pendientes
+from .presencia import en_linea, usuarios_en_linea
+from .utils import (
+    LIMITE_FEED, LIMITE_HISTORIAL, MAX_LIMITE_FEED, MAX_LIMITE_HISTORIAL,
+    comentarios_post, evento_ws, feed_posts, historial_mensajes, inbox_chat, marcar_leido
+)
 
 # Get the custom user model once
 User = get_user_model()
 
-class PostViewSet(viewsets.ModelViewSet):
+
+def contexto_presencia(view, user_ids):
+    # Presencia de solo los usuarios que se van a mostrar, en un único ZMSCORE
+    return {**view.get_serializer_context(), 'en_linea': en_linea(set(user_ids))}
+
+
+class PresenciaMixin:
+    """
+    get_serializer() con instancias completa el context con la presencia de los
+    usuarios que muestran (usuarios_presencia), en un único ZMSCORE en vez de uno
+    por usuario serializado.
+    """
+
+    def usuarios_presencia(self, objetos):
+        return []
+
+    def get_serializer(self, *args, **kwargs):
+        if args and args[0] is not None and 'context' not in kwargs:
+            objetos = list(args[0]) if kwargs.get('many') else [args[0]]
+            if kwargs.get('many'):
+                args = (objetos, *args[1:])
+            kwargs['context'] = contexto_presencia(self, self.usuarios_presencia(objetos))
+        return super().get_serializer(*args, **kwargs)
+
+
+class PostViewSet(PresenciaMixin, viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def usuarios_presencia(self, posts):
+        # Autores de los posts y de sus comentarios (prefetch en list/retrieve)
+        return [post.author_id for post in posts] + [
+            comment.author_id for post in posts for comment in post.comments.all()
+        ]
+
+    def get_queryset(self):
+        queryset = Post.objects.select_related('author')
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.prefetch_related(
+                Prefetch('comments', queryset=Comment.objects.select_related('author'))
+            )
+        return queryset
+
+    def _limite(self, request, maximo):
+        limit = request.query_params.get('limit') or LIMITE_FEED
+        if not str(limit).isdigit() or int(limit) < 1:
+            return None
+        return min(int(limit), maximo)
+
+    @action(detail=False, methods=['get'])
+    def feed(self, request):
+        """
+        Feed paginado por cursor: ?cursor=&limit= (máx. 50).
+        Cada post trae comments_count y sus últimos comentarios.
+        """
+        limite = self._limite(request, MAX_LIMITE_FEED)
+        if limite is None:
+            return Response({'error': 'limit debe ser un entero positivo'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            posts, next_cursor = feed_posts(request.query_params.get('cursor'), limite)
+        except ValueError:
+            return Response({'error': 'cursor inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        autores = [post.author_id for post in posts]
+        autores += [c.author_id for post in posts for c in post.ultimos_comentarios]
+        serializer = PostFeedSerializer(posts, many=True, context=contexto_presencia(self, autores))
+        return Response({'results': serializer.data, 'next_cursor': next_cursor})
+
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        """
+        Hilo de comentarios en orden cronológico: ?cursor=&limit= (máx. 50).
+        """
+        post = self.get_object()
+        limite = self._limite(request, MAX_LIMITE_FEED)
+        if limite is None:
+            return Response({'error': 'limit debe ser un entero positivo'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            comments, next_cursor = comentarios_post(post.id, request.query_params.get('cursor'), limite)
+        except ValueError:
+            return Response({'error': 'cursor inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = CommentSerializer(
+            comments, many=True, context=contexto_presencia(self, [c.author_id for c in comments])
+        )
+        return Response({'results': serializer.data, 'next_cursor': next_cursor})
+
     def perform_create(self, serializer):
-        post = serializer.save(author=self.request.user)
+        serializer.save(author=self.request.user)
 
-        # Send real-time update
+        # Send real-time update: serializer.data queda en caché y también es la respuesta
         channel_layer = get_channel_layer()
         async_to_sync(channel_layer.group_send)(
             'posts_updates',
-            {
-                'type': 'post_update',
-                'action': 'created',
-                'post': PostSerializer(post).data
-            }
+            evento_ws('post_update', action='created', post=serializer.data),
         )
 
     @action(detail=True, methods=['post'])
@@ -49,10 +135,10 @@ class PostViewSet(viewsets.ModelViewSet):
             channel_layer = get_channel_layer()
             async_to_sync(channel_layer.group_send)(
                 "posts_updates",
-                {
-                    "type": "comment_update",
-                    "action": "created",
-                    "comment": {
+                evento_ws(
+                    "comment_update",
+                    action="created",
+                    comment={
                         "id": comment.id,
                         "content": comment.content,
                         "created_at": comment.created_at.isoformat(),
@@ -63,10 +149,10 @@ class PostViewSet(viewsets.ModelViewSet):
                             "avatar": comment.author.avatar.url if comment.author.avatar else None,
                         },
                     },
-                },
+                ),
             )
 
-            return Response(CommentSerializer(comment).data, status=status.HTTP_201_CREATED)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -83,12 +169,24 @@ class PostViewSet(viewsets.ModelViewSet):
         return Response({'image_url': image_url})
 
 
-class ChatRoomViewSet(viewsets.ModelViewSet):
+class ChatRoomViewSet(PresenciaMixin, viewsets.ModelViewSet):
     serializer_class = ChatRoomSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def usuarios_presencia(self, salas):
+        # El último mensaje es de un participante
+        return [user.id for sala in salas for user in sala.participants.all()]
+
     def get_queryset(self):
-        return ChatRoom.objects.filter(participants=self.request.user)
+        return ChatRoom.objects.filter(participants=self.request.user).prefetch_related('participants')
+
+    def list(self, request, *args, **kwargs):
+        # Inbox: consultas constantes sin importar cuántas salas tenga el usuario
+        salas = inbox_chat(request.user)
+        usuarios = [u.id for sala in salas for u in sala.participants.all()]
+        usuarios += [sala.ultimo_mensaje.sender_id for sala in salas if sala.ultimo_mensaje]
+        serializer = self.get_serializer(salas, many=True, context=contexto_presencia(self, usuarios))
+        return Response(serializer.data)
 
     @action(detail=False, methods=['post'])
     def create_or_get_room(self, request):
@@ -115,22 +213,82 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
+        """
+        Historial paginado por cursor.
+        Query params: before=<message_id> (anteriores a ese mensaje), limit (máx. 200).
+        Respuesta: { results (orden cronológico), next_cursor } → next_cursor va en ?before=
+        """
         room = self.get_object()
-        messages = room.messages.all()
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        before = request.query_params.get('before')
+        limit = request.query_params.get('limit') or LIMITE_HISTORIAL
+        if (before and not before.isdigit()) or not str(limit).isdigit() or int(limit) < 1:
+            return Response({'error': 'before y limit deben ser enteros positivos'}, status=status.HTTP_400_BAD_REQUEST)
+
+        messages, has_more = historial_mensajes(
+            room.id,
+            antes_de=int(before) if before else None,
+            limite=min(int(limit), MAX_LIMITE_HISTORIAL),
+        )
+        serializer = MessageSerializer(
+            messages, many=True, context=contexto_presencia(self, [m.sender_id for m in messages])
+        )
+        return Response({
+            'results': serializer.data,
+            'next_cursor': messages[0].id if has_more else None,
+        })
+
+    @action(detail=True, methods=['post'])
+    def mark_read(self, request, pk=None):
+        """
+        Body opcional: { "message_id": 123 } → marca como leído hasta ese mensaje
+        (por defecto hasta el último de la sala). Si el mensaje aún no se volcó
+        (CHAT_WRITE_BEHIND) responde 202 con pending=true y la lectura se completa
+        cuando se inserta.
+        """
+        room = self.get_object()
+        message_id = request.data.get('message_id')
+        pendiente = False
+        if message_id is not None:
+            if not str(message_id).isdigit():
+                return Response({'error': 'Mensaje no encontrado en la sala'}, status=status.HTTP_400_BAD_REQUEST)
+            message_id = int(message_id)
+            if not room.messages.filter(id=message_id).exists():
+                # Con escritura diferida el mensaje puede seguir en el stream
+                pendiente = settings.CHAT_WRITE_BEHIND and any(
+                    p['id'] == message_id for p in mensajes_pendientes(room.id)
+                )
+                if not pendiente:
+                    return Response({'error': 'Mensaje no encontrado en la sala'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if pendiente:
+            # Se marca lo ya volcado; el volcador completa la lectura al insertar el mensaje
+            diferir_lectura(room.id, request.user.id, message_id)
+            lectura = marcar_leido(room, request.user)
+        else:
+            lectura = marcar_leido(room, request.user, message_id)
+        return Response({
+            'room': room.id,
+            'unread_count': lectura.unread_count,
+            'last_read_message': lectura.last_read_message_id,
+            'pending': pendiente,
+        }, status=status.HTTP_202_ACCEPTED if pendiente else status.HTTP_200_OK)
     
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(PresenciaMixin, viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserComunidadSerializer
     permission_classes = [permissions.IsAuthenticated]
+
+    def usuarios_presencia(self, usuarios):
+        return [user.id for user in usuarios]
     
     @action(detail=False, methods=['get'])
     def online_users(self, request):
-        # Filtra directamente el campo is_online del modelo User
-        online_users = User.objects.filter(is_online=True).exclude(id=request.user.id)
-        serializer = self.get_serializer(online_users, many=True)
+        # La presencia vive en Redis; una lectura y un filtro por id
+        en_linea = usuarios_en_linea()
+        online_users = User.objects.filter(id__in=en_linea).exclude(id=request.user.id)
+        context = {**self.get_serializer_context(), 'en_linea': en_linea}
+        serializer = self.get_serializer(online_users, many=True, context=context)
         return Response(serializer.data)
     
 
@@ -8,13 +8,17 @@ from rest_framework.permissions import IsAuthenticated
 
 from .models import Curso
 from .serializers import CursoSerializer
+from accounts.cache_http import respuesta_condicional
+from accounts.mixins import AccionesMasivasMixin
 from accounts.permissions import HasPermissionMap
 from accounts.utils import log_user_action
 
-class CursoViewSet(viewsets.ModelViewSet):
+class CursoViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = Curso.objects.all().order_by("id")
     serializer_class = CursoSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    accion_estado_masiva = "toggle_estado"
+    nombre_masivo = "cursos"
 
     permission_code_map = {
         "list": "listar_cursos",
@@ -63,5 +67,8 @@ class CursoViewSet(viewsets.ModelViewSet):
         Retorna la lista de cursos que tienen is_active=True.
         """
         cursos_activos = self.get_queryset().filter(is_active=True)
-        serializer = self.get_serializer(cursos_activos, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return respuesta_condicional(
+            request,
+            [(cursos_activos, "updated_at")],
+            lambda: self.get_serializer(cursos_activos, many=True).data,
+        )
\ No newline at end of file
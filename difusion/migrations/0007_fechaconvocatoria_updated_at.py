@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('difusion', '0006_ministerio_fecha_confirmacion_recepcion_convocatoria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fechaconvocatoria',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -51,6 +51,7 @@ class FechaConvocatoria(models.Model):
     gestion = models.CharField(max_length=10)  # ej "2025"
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     periodic_task = models.OneToOneField(
         PeriodicTask, null=True, blank=True, on_delete=models.SET_NULL, related_name="fecha_convocatoria"
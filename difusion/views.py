@@ -24,14 +24,18 @@ from .serializers import (
 )
 from .utils import send_email_notification
 from .task import enviar_convocatoria_email  # Importación de la tarea de Celery
+from accounts.cache_http import respuesta_condicional
+from accounts.mixins import AccionesMasivasMixin
 from accounts.permissions import HasPermissionMap
 from accounts.utils import log_user_action
 
 # --- Vista para Ministerios ---
-class MinisterioViewSet(viewsets.ModelViewSet):
+class MinisterioViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = Ministerio.objects.all().order_by("id")
     serializer_class = MinisterioSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    accion_estado_masiva = "toggle_estado"
+    nombre_masivo = "ministerios"
     
     permission_code_map = {
         "list": "listar_ministerios",
@@ -39,6 +43,7 @@ class MinisterioViewSet(viewsets.ModelViewSet):
         "create": "crear_ministerios",
         "update": "editar_ministerios",
         "partial_update": "editar_ministerios",
+        "destroy": "eliminar_ministerios",
         "toggle_estado": "editar_ministerios",
         "encargados_by_ministerio": "listar_encargados"
     }
@@ -73,10 +78,12 @@ class MinisterioViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 # --- Vista para Encargados ---
-class EncargadoViewSet(viewsets.ModelViewSet):
+class EncargadoViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = Encargado.objects.all().order_by("id")
     serializer_class = EncargadoSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    accion_estado_masiva = "toggle_estado"
+    nombre_masivo = "encargados"
     
     permission_code_map = {
         "list": "listar_encargados",
@@ -84,6 +91,7 @@ class EncargadoViewSet(viewsets.ModelViewSet):
         "create": "crear_encargados",
         "update": "editar_encargados",
         "partial_update": "editar_encargados",
+        "destroy": "eliminar_encargados",
         "toggle_estado": "editar_encargados",
     }
     
@@ -109,10 +117,12 @@ class EncargadoViewSet(viewsets.ModelViewSet):
         return Response({'message': f'Encargado {encargado.nombre} ahora está {status_message}.'}, status=status.HTTP_200_OK)
 
 # --- Vista para Convocatorias ---
-class ConvocatoriaViewSet(viewsets.ModelViewSet):
+class ConvocatoriaViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = Convocatoria.objects.all().order_by("id")
     serializer_class = ConvocatoriaSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    accion_estado_masiva = "toggle_estado"
+    nombre_masivo = "convocatorias"
 
     permission_code_map = {
         "list": "listar_convocatorias",
@@ -154,8 +164,17 @@ class ConvocatoriaViewSet(viewsets.ModelViewSet):
 
         fechas_qs = FechaConvocatoria.objects.filter(gestion=gestion, is_active=True)
         qs = self.get_queryset().prefetch_related(Prefetch("fechas", queryset=fechas_qs))
-        serializer = self.get_serializer(qs, many=True, context={"request": request})
-        return Response(serializer.data)
+        # Validador sobre convocatorias, fechas de la gestión (incluye inactivas para detectar toggles) y sus archivos
+        return respuesta_condicional(
+            request,
+            [
+                (self.get_queryset(), "updated_at"),
+                (FechaConvocatoria.objects.filter(gestion=gestion), "updated_at"),
+                (ArchivoFechaConvocatoria.objects.filter(fecha_convocatoria__gestion=gestion), "created_at"),
+            ],
+            lambda: self.get_serializer(qs, many=True, context={"request": request}).data,
+            extra=gestion,
+        )
 
 # --- Vista para Fechas de Convocatoria ---
 class FechaConvocatoriaViewSet(viewsets.ModelViewSet):
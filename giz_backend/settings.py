@@ -27,7 +27,13 @@ MEDIA_ROOT = os.path.join(BASE_DIR, config("MEDIA_ROOT_PATH", default="media"))
 
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
-CELERY_BEAT_SCHEDULE = {}
+CELERY_BEAT_SCHEDULE = {
+    # Offline de usuarios cuya presencia venció sin desconectarse (ver comunidad/presencia.py)
+    "barrer-presencia-vencida": {
+        "task": "comunidad.task.barrer_presencia_vencida",
+        "schedule": 30.0,
+    },
+}
 
 
 # ======================
@@ -43,6 +49,7 @@ INSTALLED_APPS = [
     "daphne",
     "django.contrib.staticfiles",
     "django.contrib.sites",
+    "django.contrib.postgres",
     # Terceros
     "rest_framework",
     "rest_framework_simplejwt.token_blacklist",
@@ -193,4 +200,9 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Redis propio de comunidad (stream de mensajes diferidos, presencia)
+COMUNIDAD_REDIS_URL = config("COMUNIDAD_REDIS_URL", default="redis://localhost:6379/0")
+# Si está activo, ChatConsumer difunde antes de persistir y `volcar_mensajes_chat` escribe en lotes
+CHAT_WRITE_BEHIND = config("CHAT_WRITE_BEHIND", default=False, cast=bool)
+
 SITE_ID = 1
\ No newline at end of file
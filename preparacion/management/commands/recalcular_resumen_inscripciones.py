@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from preparacion.utils import recalcular_resumen_inscripcion
+
+
+class Command(BaseCommand):
+    help = "Reconstruye ResumenInscripcion para todas las capacitaciones y asesoramientos."
+
+    def handle(self, *args, **options):
+        recalcular_resumen_inscripcion("capacitacion")
+        recalcular_resumen_inscripcion("asesoramiento")
+        self.stdout.write(self.style.SUCCESS("Resumen de inscripciones recalculado."))
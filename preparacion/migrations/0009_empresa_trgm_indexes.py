@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:59
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('preparacion', '0008_alter_empresa_nit'),
+        ('requisitos', '0013_reporteevaluacion'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='empresa',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nombre'], name='empresa_nombre_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='empresa',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['matricula'], name='empresa_matricula_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='empresa',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nit'], name='empresa_nit_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def consolidar_fases(apps, schema_editor):
+    """
+    Deja una sola FaseEmpresa por (empresa, gestion): la de fase más alta.
+    """
+    FaseEmpresa = apps.get_model("preparacion", "FaseEmpresa")
+
+    vistas = set()
+    duplicadas = []
+    for fase in FaseEmpresa.objects.order_by("empresa_id", "gestion", "-fase_numero", "-updated_at", "-id").iterator():
+        clave = (fase.empresa_id, fase.gestion)
+        if clave in vistas:
+            duplicadas.append(fase.id)
+        vistas.add(clave)
+
+    FaseEmpresa.objects.filter(id__in=duplicadas).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('preparacion', '0010_importacionempresas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicionFaseEmpresa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gestion', models.CharField(max_length=10)),
+                ('fase_anterior', models.IntegerField(blank=True, null=True)),
+                ('fase_nueva', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='faseempresa',
+            index=models.Index(fields=['gestion', 'fase_numero'], name='preparacion_gestion_abf538_idx'),
+        ),
+        migrations.AddField(
+            model_name='transicionfaseempresa',
+            name='empresa',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transiciones_fase', to='preparacion.empresa'),
+        ),
+        migrations.AddField(
+            model_name='transicionfaseempresa',
+            name='evaluador',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transiciones_fase_registradas', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='transicionfaseempresa',
+            index=models.Index(fields=['empresa', 'gestion', 'created_at'], name='preparacion_empresa_8c302a_idx'),
+        ),
+        migrations.RunPython(consolidar_fases, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='faseempresa',
+            constraint=models.UniqueConstraint(fields=('empresa', 'gestion'), name='fase_empresa_unica_por_gestion'),
+        ),
+    ]
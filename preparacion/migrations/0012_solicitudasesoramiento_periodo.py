@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:04
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('preparacion', '0011_fase_empresa_estado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solicitudasesoramiento',
+            name='periodo',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(fechaAprobada__isnull=False, then=models.Func(models.F('fechaAprobada'), models.F('fechaAprobada'), models.Value('[]'), function='DATERANGE')), default=models.Func(django.db.models.functions.comparison.Least('fechaTentativaInicial', 'fechaTentativaFinal'), django.db.models.functions.comparison.Greatest('fechaTentativaInicial', 'fechaTentativaFinal'), models.Value('[]'), function='DATERANGE'), output_field=django.contrib.postgres.fields.ranges.DateRangeField()), output_field=django.contrib.postgres.fields.ranges.DateRangeField()),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudasesoramiento',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['periodo'], name='solicitud_periodo_gist'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('preparacion', '0012_solicitudasesoramiento_periodo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenInscripcion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('tipoSello', 'Tipo de sello'), ('departamento', 'Departamento'), ('gestion', 'Gestión')], max_length=20)),
+                ('valor', models.CharField(blank=True, max_length=255)),
+                ('etiqueta', models.CharField(blank=True, max_length=255)),
+                ('empresas', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('asesoramiento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumen_inscripciones', to='preparacion.asesoramiento')),
+                ('capacitacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumen_inscripciones', to='preparacion.capacitacion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['capacitacion', 'dimension'], name='preparacion_capacit_4a9b0a_idx'), models.Index(fields=['asesoramiento', 'dimension'], name='preparacion_asesora_d6a7fa_idx')],
+            },
+        ),
+    ]
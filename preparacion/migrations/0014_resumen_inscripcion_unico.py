@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:27
+
+from django.db import migrations, models
+
+
+def eliminar_duplicados(apps, schema_editor):
+    """
+    Deja una sola fila por (objeto, dimension, valor): la actualizada más recientemente.
+    """
+    ResumenInscripcion = apps.get_model("preparacion", "ResumenInscripcion")
+
+    vistas = set()
+    duplicadas = []
+    filas = ResumenInscripcion.objects.order_by(
+        "capacitacion_id", "asesoramiento_id", "dimension", "valor", "-updated_at", "-id"
+    ).values_list("id", "capacitacion_id", "asesoramiento_id", "dimension", "valor")
+    for fila_id, *clave in filas.iterator():
+        clave = tuple(clave)
+        if clave in vistas:
+            duplicadas.append(fila_id)
+        vistas.add(clave)
+
+    ResumenInscripcion.objects.filter(id__in=duplicadas).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('preparacion', '0013_resumeninscripcion'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='resumeninscripcion',
+            constraint=models.UniqueConstraint(condition=models.Q(('capacitacion__isnull', False)), fields=('capacitacion', 'dimension', 'valor'), name='resumen_inscripcion_capacitacion_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumeninscripcion',
+            constraint=models.UniqueConstraint(condition=models.Q(('asesoramiento__isnull', False)), fields=('asesoramiento', 'dimension', 'valor'), name='resumen_inscripcion_asesoramiento_unico'),
+        ),
+    ]
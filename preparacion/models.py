@@ -1,5 +1,8 @@
 # apps/preparacion/models.py
+from django.contrib.postgres.fields import DateRangeField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
 from django.db import models
+from django.db.models.functions import Greatest, Least
 from auditlog.registry import auditlog
 from requisitos.models import TipoSello
 from accounts.models import User
@@ -39,6 +42,14 @@ class Empresa(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Índices trigram (pg_trgm) para la búsqueda difusa y la detección de duplicados
+        indexes = [
+            GinIndex(fields=["nombre"], name="empresa_nombre_trgm", opclasses=["gin_trgm_ops"]),
+            GinIndex(fields=["matricula"], name="empresa_matricula_trgm", opclasses=["gin_trgm_ops"]),
+            GinIndex(fields=["nit"], name="empresa_nit_trgm", opclasses=["gin_trgm_ops"]),
+        ]
+
     def __str__(self):
         return f"{self.nombre} ({self.nit})"
 
@@ -81,6 +92,57 @@ class Asesoramiento(models.Model):
 auditlog.register(Asesoramiento)
 
 
+# ============================
+#   RESUMEN DE INSCRIPCIONES
+# ============================
+class ResumenInscripcion(models.Model):
+    """
+    Conteo de empresas inscritas en una capacitación o asesoramiento, desglosado por
+    una dimensión (total, tipoSello, departamento o gestión). Se reconstruye por
+    objeto desde las tablas N a N de Empresa; ver preparacion/signals.py.
+    """
+    DIMENSIONES = (
+        ("total", "Total"),
+        ("tipoSello", "Tipo de sello"),
+        ("departamento", "Departamento"),
+        ("gestion", "Gestión"),
+    )
+
+    capacitacion = models.ForeignKey(
+        Capacitacion, on_delete=models.CASCADE, null=True, blank=True, related_name="resumen_inscripciones"
+    )
+    asesoramiento = models.ForeignKey(
+        Asesoramiento, on_delete=models.CASCADE, null=True, blank=True, related_name="resumen_inscripciones"
+    )
+    dimension = models.CharField(max_length=20, choices=DIMENSIONES)
+    valor = models.CharField(max_length=255, blank=True)
+    etiqueta = models.CharField(max_length=255, blank=True)
+    empresas = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["capacitacion", "dimension"]),
+            models.Index(fields=["asesoramiento", "dimension"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["capacitacion", "dimension", "valor"],
+                condition=models.Q(capacitacion__isnull=False),
+                name="resumen_inscripcion_capacitacion_unico",
+            ),
+            models.UniqueConstraint(
+                fields=["asesoramiento", "dimension", "valor"],
+                condition=models.Q(asesoramiento__isnull=False),
+                name="resumen_inscripcion_asesoramiento_unico",
+            ),
+        ]
+
+    def __str__(self):
+        objeto = f"capacitación {self.capacitacion_id}" if self.capacitacion_id else f"asesoramiento {self.asesoramiento_id}"
+        return f"{objeto} - {self.dimension}={self.etiqueta or self.valor}: {self.empresas}"
+
+
 # ============================
 #   FASE EMPRESA
 # ============================
@@ -101,6 +163,15 @@ class FaseEmpresa(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Una sola fila con la fase actual por (empresa, gestion); el historial va en TransicionFaseEmpresa
+        constraints = [
+            models.UniqueConstraint(fields=["empresa", "gestion"], name="fase_empresa_unica_por_gestion"),
+        ]
+        indexes = [
+            models.Index(fields=["gestion", "fase_numero"]),
+        ]
+
     def __str__(self):
         return f"{self.empresa.nombre} - Fase {self.fase_numero} ({self.gestion})"
 
@@ -109,6 +180,32 @@ class FaseEmpresa(models.Model):
 auditlog.register(FaseEmpresa)
 
 
+class TransicionFaseEmpresa(models.Model):
+    """
+    Registro de solo inserción de los cambios de fase de una empresa en una gestión.
+    """
+    empresa = models.ForeignKey(
+        Empresa, on_delete=models.CASCADE, related_name="transiciones_fase"
+    )
+    gestion = models.CharField(max_length=10)
+    fase_anterior = models.IntegerField(null=True, blank=True)
+    fase_nueva = models.IntegerField()
+    evaluador = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="transiciones_fase_registradas"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(fields=["empresa", "gestion", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.empresa_id}: {self.fase_anterior} -> {self.fase_nueva} ({self.gestion})"
+
+
 # ============================
 #   SOLICITUD DE ASESORAMIENTO
 # ============================
@@ -121,6 +218,16 @@ class SolicitudAsesoramiento(models.Model):
         ("CANCELADO", "Cancelado"),
     ]
 
+    # Estado destino -> estados desde los que se permite llegar a él
+    TRANSICIONES = {
+        "APROBADO": ("SOLICITADO",),
+        "RECHAZADO": ("SOLICITADO",),
+        "COMPLETADO": ("APROBADO",),
+        "CANCELADO": ("SOLICITADO", "APROBADO"),
+    }
+    # Estados destino que notifican por correo a la empresa
+    ESTADOS_CON_CORREO = ("APROBADO", "RECHAZADO")
+
     empresa = models.ForeignKey(
         Empresa, on_delete=models.CASCADE, related_name="solicitudes_asesoramiento"
     )
@@ -133,9 +240,37 @@ class SolicitudAsesoramiento(models.Model):
     fechaAprobada = models.DateField(null=True, blank=True)
     estado = models.CharField(max_length=20, choices=ESTADOS, default="SOLICITADO")
 
+    # Rango ocupado por la solicitud, calculado por Postgres: el día aprobado si existe,
+    # si no el rango tentativo (inclusivo). Lo usan las consultas de agenda con el índice GiST.
+    periodo = models.GeneratedField(
+        expression=models.Case(
+            models.When(
+                fechaAprobada__isnull=False,
+                then=models.Func(
+                    models.F("fechaAprobada"), models.F("fechaAprobada"), models.Value("[]"),
+                    function="DATERANGE",
+                ),
+            ),
+            default=models.Func(
+                Least("fechaTentativaInicial", "fechaTentativaFinal"),
+                Greatest("fechaTentativaInicial", "fechaTentativaFinal"),
+                models.Value("[]"),
+                function="DATERANGE",
+            ),
+            output_field=DateRangeField(),
+        ),
+        output_field=DateRangeField(),
+        db_persist=True,
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            GistIndex(fields=["periodo"], name="solicitud_periodo_gist"),
+        ]
+
     def __str__(self):
         return f"{self.empresa.nombre} - {self.nombreAsesoramiento} ({self.estado})"
 
@@ -202,3 +337,35 @@ class PublicacionEmpresaComunidad(models.Model):
 
 # registrar para auditlog
 auditlog.register(PublicacionEmpresaComunidad)
+
+
+# ============================
+#   IMPORTACIÓN DE EMPRESAS
+# ============================
+class ImportacionEmpresas(models.Model):
+    """
+    Carga masiva de empresas y sus representantes desde un CSV, procesada por Celery.
+    'errores' guarda los problemas por fila: [{"fila": n, "errores": [...]}].
+    """
+    ESTADOS = (
+        ("PENDIENTE", "Pendiente"),
+        ("PROCESANDO", "Procesando"),
+        ("COMPLETADO", "Completado"),
+        ("ERROR", "Error"),
+    )
+
+    archivo = models.FileField(upload_to="importaciones/empresas/")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="PENDIENTE")
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    empresas_creadas = models.PositiveIntegerField(default=0)
+    usuarios_creados = models.PositiveIntegerField(default=0)
+    errores = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    solicitado_por = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="importaciones_empresas"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Importación {self.id} - {self.estado}"
@@ -1,7 +1,9 @@
 # apps/preparacion/serializers.py
+from django.db import transaction
 from rest_framework import serializers
 from requisitos.models import TipoSello
 from accounts.models import User
+from accounts.utils import log_user_action
 from accounts.serializers import UserSerializer
 from .models import (
     Empresa,
@@ -11,7 +13,9 @@ from .models import (
     SolicitudAsesoramiento,
     PublicacionEmpresaComunidad,
     ArchivoAsesoramiento,
-    EncargadoAsesoramiento
+    EncargadoAsesoramiento,
+    ImportacionEmpresas,
+    TransicionFaseEmpresa
 )
 
 # ============================
@@ -85,6 +89,13 @@ class FaseEmpresaSerializer(serializers.ModelSerializer):
         model = FaseEmpresa
         fields = ["id", "fase_numero", "gestion", "evaluador", "is_active", "created_at"]
 
+class TransicionFaseEmpresaSerializer(serializers.ModelSerializer):
+    evaluador = SimpleUserSerializer(read_only=True)
+
+    class Meta:
+        model = TransicionFaseEmpresa
+        fields = ["id", "gestion", "fase_anterior", "fase_nueva", "evaluador", "created_at"]
+
 # ================
 # EMPRESA
 # ================
@@ -145,13 +156,51 @@ class EmpresaSerializer(serializers.ModelSerializer):
             return TipoSelloSerializer(obj.tipoSello, context=self.context).data
         return None
 
+    def _vincular_usuarios(self, empresa, usuarios, desvincular_resto):
+        """
+        Aplica la membresía de usuarios con dos UPDATE sobre accounts_user.empresa_id
+        (desvincular / vincular) en lugar de un User.save() por usuario, y deja un
+        único registro de auditoría con los ids afectados.
+        """
+        ids_nuevos = {u.id for u in usuarios}
+        with transaction.atomic():
+            desvinculados = []
+            if desvincular_resto:
+                desvinculados = list(
+                    User.objects.filter(empresa=empresa)
+                    .exclude(id__in=ids_nuevos)
+                    .values_list("id", flat=True)
+                )
+                if desvinculados:
+                    User.objects.filter(id__in=desvinculados).update(empresa=None)
+
+            vinculados = list(
+                User.objects.filter(id__in=ids_nuevos)
+                .exclude(empresa=empresa)
+                .values_list("id", flat=True)
+            )
+            if vinculados:
+                User.objects.filter(id__in=vinculados).update(empresa=empresa)
+
+        # Invalida las copias en memoria: instancias validadas y el prefetch de la empresa
+        for user in usuarios:
+            user.empresa = empresa
+        getattr(empresa, "_prefetched_objects_cache", {}).pop("usuarios", None)
+
+        if vinculados or desvinculados:
+            request = self.context.get("request")
+            log_user_action(
+                getattr(request, "user", None),
+                f"Actualizó los usuarios de la empresa {empresa.nombre}",
+                request,
+                extra={"empresa_id": empresa.id, "vinculados": vinculados, "desvinculados": desvinculados},
+            )
+
     def create(self, validated_data):
         usuarios = validated_data.pop("usuarios", [])
         empresa = Empresa.objects.create(**validated_data)
         if usuarios:
-            for user in usuarios:
-                user.empresa = empresa
-                user.save()
+            self._vincular_usuarios(empresa, usuarios, desvincular_resto=False)
         return empresa
 
     def update(self, instance, validated_data):
@@ -160,20 +209,46 @@ class EmpresaSerializer(serializers.ModelSerializer):
         instance = super().update(instance, validated_data)
 
         if usuarios_nuevos is not None:
-            # Primero, desvincula a los usuarios que ya no están
-            usuarios_a_remover = instance.usuarios.exclude(id__in=[u.id for u in usuarios_nuevos])
-            for user in usuarios_a_remover:
-                user.empresa = None
-                user.save()
-
-            # Luego, vincula a los nuevos usuarios
-            for user in usuarios_nuevos:
-                if user.empresa != instance:
-                    user.empresa = instance
-                    user.save()
+            self._vincular_usuarios(instance, usuarios_nuevos, desvincular_resto=True)
 
         return instance
 
+class EmpresaListSerializer(serializers.ModelSerializer):
+    """
+    Representación compacta para el listado: solo ids y nombres, sin el catálogo
+    del tipo de sello ni relaciones N a N.
+    """
+    tipoSello = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Empresa
+        fields = [
+            "id",
+            "nombre",
+            "matricula",
+            "tipo",
+            "is_active",
+            "isAproved",
+            "tipoSello",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = fields
+
+    def get_tipoSello(self, obj):
+        if obj.tipoSello:
+            return {"id": obj.tipoSello.id, "nombre": obj.tipoSello.nombre}
+        return None
+
+
+class EmpresaBusquedaSerializer(EmpresaListSerializer):
+    similitud = serializers.FloatField(read_only=True, default=None)
+
+    class Meta(EmpresaListSerializer.Meta):
+        fields = EmpresaListSerializer.Meta.fields + ["nit", "similitud"]
+        read_only_fields = fields
+
+
 # ================
 # SOLICITUD DE ASESORAMIENTO
 # ================
@@ -224,4 +299,24 @@ class PublicacionEmpresaComunidadSerializer(serializers.ModelSerializer):
         request = self.context.get("request")
         if request and obj.foto:
             return request.build_absolute_uri(obj.foto.url)
-        return None
\ No newline at end of file
+        return None
+
+# ================
+# IMPORTACIÓN DE EMPRESAS
+# ================
+class ImportacionEmpresasSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportacionEmpresas
+        fields = [
+            "id", "archivo", "estado", "filas_procesadas", "empresas_creadas",
+            "usuarios_creados", "errores", "error", "created_at", "updated_at",
+        ]
+        read_only_fields = [
+            "id", "estado", "filas_procesadas", "empresas_creadas",
+            "usuarios_creados", "errores", "error", "created_at", "updated_at",
+        ]
+
+    def validate_archivo(self, archivo):
+        if not archivo.name.lower().endswith(".csv"):
+            raise serializers.ValidationError("Solo se admiten archivos .csv")
+        return archivo
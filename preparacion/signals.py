@@ -0,0 +1,94 @@
+# apps/preparacion/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from dashboard.models import Departamento
+from .models import Empresa, FaseEmpresa
+from .utils import (
+    inscripciones_empresas,
+    recalcular_resumen_inscripcion,
+    recalcular_resumen_inscripcion_empresa,
+    refrescar_resumen_empresas,
+)
+
+
+# ============================
+#   RESUMEN DE INSCRIPCIONES
+# ============================
+# Igual que la completitud de postulación, los recálculos corren al confirmar la transacción.
+
+def _actualizar_por_m2m(relacion, related_name, instance, action, reverse, pk_set):
+    atributo = f"_{related_name}_previas"
+    if action == "pre_clear" and not reverse:
+        # Tras el clear ya no se sabe qué objetos tenía la empresa
+        setattr(instance, atributo, set(getattr(instance, related_name).values_list("id", flat=True)))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if reverse:
+        ids = {instance.pk}
+    elif action == "post_clear":
+        ids = getattr(instance, atributo, set())
+    else:
+        ids = set(pk_set or ())
+    if ids:
+        transaction.on_commit(lambda: recalcular_resumen_inscripcion(relacion, ids))
+
+
+@receiver(m2m_changed, sender=Empresa.capacitaciones.through)
+def actualizar_resumen_capacitaciones(sender, instance, action, reverse, pk_set, **kwargs):
+    _actualizar_por_m2m("capacitacion", "capacitaciones", instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Empresa.asesoramientos.through)
+def actualizar_resumen_asesoramientos(sender, instance, action, reverse, pk_set, **kwargs):
+    _actualizar_por_m2m("asesoramiento", "asesoramientos", instance, action, reverse, pk_set)
+
+
+@receiver(post_save, sender=Empresa)
+def actualizar_resumen_por_empresa(sender, instance, created, **kwargs):
+    # Una empresa nueva todavía no tiene inscripciones; al editarla puede cambiar su tipoSello
+    if created:
+        return
+    refrescar_resumen_empresas([instance.pk])
+
+
+@receiver(pre_delete, sender=Empresa)
+def guardar_inscripciones_empresa(sender, instance, **kwargs):
+    instance._inscripciones_previas = inscripciones_empresas([instance.pk])
+
+
+@receiver(post_delete, sender=Empresa)
+def actualizar_resumen_por_empresa_eliminada(sender, instance, **kwargs):
+    capacitaciones, asesoramientos = getattr(instance, "_inscripciones_previas", (set(), set()))
+    if capacitaciones or asesoramientos:
+        transaction.on_commit(lambda: recalcular_resumen_inscripcion_empresa(capacitaciones, asesoramientos))
+
+
+@receiver(pre_save, sender=Departamento)
+def guardar_empresa_previa_departamento(sender, instance, **kwargs):
+    # Si el departamento cambia de empresa, la anterior también pierde ese valor
+    instance._empresa_previa_id = (
+        Departamento.objects.filter(pk=instance.pk).values_list("empresa_id", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver([post_save, post_delete], sender=Departamento)
+def actualizar_resumen_por_departamento(sender, instance, **kwargs):
+    refrescar_resumen_empresas([instance.empresa_id, getattr(instance, "_empresa_previa_id", None)])
+
+
+@receiver(post_save, sender=FaseEmpresa)
+def actualizar_resumen_por_fase(sender, instance, created, update_fields=None, **kwargs):
+    # Solo la gestión entra al resumen: un cambio de fase dentro de la misma gestión no lo altera
+    if not created and update_fields and not {"empresa", "gestion"} & set(update_fields):
+        return
+    refrescar_resumen_empresas([instance.empresa_id])
+
+
+@receiver(post_delete, sender=FaseEmpresa)
+def actualizar_resumen_por_fase_eliminada(sender, instance, **kwargs):
+    refrescar_resumen_empresas([instance.empresa_id])
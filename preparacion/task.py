@@ -1,10 +1,15 @@
+import csv
+
 from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.db import IntegrityError
 from accounts.models import User
-from .models import SolicitudAsesoramiento
+from accounts.utils import log_user_action
+from .models import ImportacionEmpresas, SolicitudAsesoramiento
+from .utils import ImportadorEmpresas, leer_filas_csv
 
 
 @shared_task
@@ -56,3 +61,57 @@ def enviar_solicitud_asesoramiento_email(solicitud_id):
 
     except SolicitudAsesoramiento.DoesNotExist:
         print(f"Solicitud {solicitud_id} no encontrada.")
+
+
+@shared_task
+def importar_empresas(importacion_id):
+    """
+    Procesa una ImportacionEmpresas por lotes: valida, hashea contraseñas en paralelo
+    e inserta con bulk_create. El progreso y los errores por fila se guardan tras cada lote.
+    """
+    try:
+        importacion = ImportacionEmpresas.objects.get(id=importacion_id)
+    except ImportacionEmpresas.DoesNotExist:
+        print(f"Importación {importacion_id} no encontrada.")
+        return
+
+    ImportacionEmpresas.objects.filter(id=importacion.id).update(estado="PROCESANDO")
+    importador = ImportadorEmpresas()
+    filas = empresas = usuarios = 0
+    errores = []
+
+    try:
+        with importacion.archivo.open("rb") as archivo:
+            for lote in leer_filas_csv(archivo):
+                try:
+                    creadas, creados, errores_lote = importador.procesar_lote(lote)
+                except IntegrityError as e:
+                    # Conflicto con un registro creado en paralelo: se descarta el lote completo
+                    creadas, creados = 0, 0
+                    errores_lote = [{"fila": numero, "errores": [f"Lote descartado: {e}"]} for numero, _ in lote]
+
+                filas += len(lote)
+                empresas += creadas
+                usuarios += creados
+                errores.extend(errores_lote)
+                ImportacionEmpresas.objects.filter(id=importacion.id).update(
+                    filas_procesadas=filas,
+                    empresas_creadas=empresas,
+                    usuarios_creados=usuarios,
+                    errores=errores,
+                )
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        # Archivo ilegible: error esperado, se informa en la importación
+        ImportacionEmpresas.objects.filter(id=importacion.id).update(estado="ERROR", error=str(e))
+        return
+    except Exception as e:
+        # Cualquier otro fallo no debe dejar la importación en PROCESANDO
+        ImportacionEmpresas.objects.filter(id=importacion.id).update(estado="ERROR", error=str(e))
+        raise
+
+    ImportacionEmpresas.objects.filter(id=importacion.id).update(estado="COMPLETADO")
+    log_user_action(
+        importacion.solicitado_por,
+        f"Importó {empresas} empresas y {usuarios} usuarios (importación {importacion.id})",
+        extra={"filas": filas, "errores": len(errores)},
+    )
@@ -1,5 +1,5 @@
 from rest_framework.routers import DefaultRouter
-from .views import ArchivoAsesoramientoViewSet, AsesoramientoViewSet, CapacitacionViewSet, EmpresaViewSet, EncargadoAsesoramientoViewSet, PublicacionEmpresaComunidadViewSet, SolicitudAsesoramientoViewSet
+from .views import ArchivoAsesoramientoViewSet, AsesoramientoViewSet, CapacitacionViewSet, EmpresaViewSet, EncargadoAsesoramientoViewSet, ImportacionEmpresasViewSet, PublicacionEmpresaComunidadViewSet, SolicitudAsesoramientoViewSet
 
 router = DefaultRouter()
 router.register(r"empresas", EmpresaViewSet, basename="empresa")
@@ -9,5 +9,6 @@ router.register(r"asesoramiento", AsesoramientoViewSet, basename="asesoramiento"
 router.register(r"asesoramiento-archivos", ArchivoAsesoramientoViewSet, basename="asesoramiento-archivos")
 router.register(r"asesoramiento-encargados", EncargadoAsesoramientoViewSet, basename="asesoramiento-encargados")
 router.register(r"capacitaciones", CapacitacionViewSet, basename="capacitacion")
+router.register(r"importaciones-empresas", ImportacionEmpresasViewSet, basename="importacion-empresas")
 
 urlpatterns = router.urls
@@ -0,0 +1,533 @@
+# apps/preparacion/utils.py
+import base64
+import csv
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.postgres.expressions import ArraySubquery
+from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.db.backends.postgresql.psycopg_any import DateRange
+from django.db.models import Count, Exists, OuterRef, Q, prefetch_related_objects
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from accounts.models import Role, User
+from dashboard.models import Departamento
+from .models import (
+    Asesoramiento,
+    Capacitacion,
+    EncargadoAsesoramiento,
+    Empresa,
+    FaseEmpresa,
+    ResumenInscripcion,
+    SolicitudAsesoramiento,
+    TransicionFaseEmpresa,
+)
+
+# Umbral de similitud (pg_trgm) a partir del cual una empresa se marca como posible duplicado
+UMBRAL_DUPLICADO = 0.6
+
+
+def buscar_empresas(texto, filtros=None):
+    """
+    Empresas cuyo nombre, matrícula o NIT se parecen a 'texto', anotadas con 'similitud'.
+    Los operadores %> de pg_trgm usan los índices GIN de Empresa.
+    """
+    filtros = filtros or {}
+    qs = Empresa.objects.select_related("tipoSello")
+
+    if filtros.get("tipoSello"):
+        qs = qs.filter(tipoSello_id=filtros["tipoSello"])
+    for campo in ("isAproved", "is_active"):
+        if filtros.get(campo) is not None:
+            qs = qs.filter(**{campo: filtros[campo]})
+    if filtros.get("departamento"):
+        departamento = filtros["departamento"]
+        departamentos = Departamento.objects.filter(empresa=OuterRef("pk"))
+        if str(departamento).isdigit():
+            departamentos = departamentos.filter(id=departamento)
+        else:
+            departamentos = departamentos.filter(nombre__iexact=departamento)
+        qs = qs.filter(Exists(departamentos))
+
+    if not texto:
+        return qs
+
+    return qs.filter(
+        Q(nombre__trigram_word_similar=texto)
+        | Q(matricula__trigram_word_similar=texto)
+        | Q(nit__trigram_word_similar=texto)
+    ).annotate(
+        similitud=Greatest(
+            TrigramWordSimilarity(texto, "nombre"),
+            TrigramWordSimilarity(texto, "matricula"),
+            TrigramWordSimilarity(texto, "nit"),
+        )
+    )
+
+
+def posibles_duplicados(nombre, matricula=None, nit=None, excluir_id=None, limite=5):
+    """
+    Empresas ya registradas con nombre muy parecido o matrícula / NIT casi iguales.
+    """
+    condicion = Q(nombre__trigram_similar=nombre)
+    similitudes = [TrigramSimilarity("nombre", nombre)]
+    if matricula:
+        condicion |= Q(matricula__trigram_similar=matricula)
+        similitudes.append(TrigramSimilarity("matricula", matricula))
+    if nit:
+        condicion |= Q(nit__trigram_similar=nit)
+        similitudes.append(TrigramSimilarity("nit", nit))
+
+    qs = Empresa.objects.filter(condicion)
+    if excluir_id:
+        qs = qs.exclude(id=excluir_id)
+    similitud = Greatest(*similitudes) if len(similitudes) > 1 else similitudes[0]
+    return list(
+        qs.annotate(similitud=similitud)
+        .filter(similitud__gte=UMBRAL_DUPLICADO)
+        .order_by("-similitud", "id")
+        .values("id", "nombre", "matricula", "nit", "similitud")[:limite]
+    )
+
+
+def codificar_cursor(valores):
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """
+    Devuelve la lista codificada en el cursor o None si no es válido.
+    """
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return valores if isinstance(valores, list) and len(valores) == 2 else None
+
+
+# ============================
+#   FASES DE EMPRESA
+# ============================
+def iniciar_fase_empresa(empresa_id, gestion):
+    """
+    Crea la fila de fase actual (fase 1) si todavía no existe, con un
+    INSERT ... ON CONFLICT DO NOTHING sobre la restricción (empresa, gestion).
+    """
+    if FaseEmpresa.objects.filter(empresa_id=empresa_id, gestion=gestion).exists():
+        return
+    FaseEmpresa.objects.bulk_create(
+        [FaseEmpresa(empresa_id=empresa_id, gestion=gestion)], ignore_conflicts=True
+    )
+    # bulk_create no dispara post_save: la gestión nueva entra al resumen de inscripciones
+    refrescar_resumen_empresas([empresa_id])
+
+
+def cambiar_fase_empresa(empresa, gestion, fase_numero, evaluador=None):
+    """
+    Mueve la empresa a 'fase_numero' en la gestión. Bloquea la fila actual, la actualiza
+    y agrega la transición al historial en la misma transacción.
+    Devuelve (fase, transicion); transicion es None si ya estaba en esa fase.
+    """
+    with transaction.atomic():
+        iniciar_fase_empresa(empresa.id, gestion)
+        fase = FaseEmpresa.objects.select_for_update().get(empresa=empresa, gestion=gestion)
+        if fase.fase_numero == fase_numero:
+            return fase, None
+
+        transicion = TransicionFaseEmpresa.objects.create(
+            empresa=empresa,
+            gestion=gestion,
+            fase_anterior=fase.fase_numero,
+            fase_nueva=fase_numero,
+            evaluador=evaluador,
+        )
+        fase.fase_numero = fase_numero
+        fase.evaluador = evaluador
+        fase.save(update_fields=["fase_numero", "evaluador", "updated_at"])
+    return fase, transicion
+
+
+# ============================
+#   SOLICITUDES DE ASESORAMIENTO
+# ============================
+def transicionar_solicitudes(ids, estado, fecha_aprobada=None):
+    """
+    Aplica SolicitudAsesoramiento.TRANSICIONES con un único
+    UPDATE ... WHERE estado = ANY(origenes) RETURNING *. Solo devuelve las solicitudes
+    que realmente cambiaron de estado, así dos usuarios no pueden aplicar la misma
+    transición dos veces ni saltarse un estado.
+    """
+    origenes = SolicitudAsesoramiento.TRANSICIONES[estado]
+    ids = [int(i) for i in ids]
+    if not ids:
+        return []
+
+    opts = SolicitudAsesoramiento._meta
+
+    def columna(nombre):
+        return connection.ops.quote_name(opts.get_field(nombre).column)
+
+    asignaciones = [f"{columna('estado')} = %s", f"{columna('updated_at')} = %s"]
+    params = [estado, timezone.now()]
+    if fecha_aprobada is not None:
+        asignaciones.append(f"{columna('fechaAprobada')} = %s")
+        params.append(fecha_aprobada)
+
+    sql = (
+        f"UPDATE {connection.ops.quote_name(opts.db_table)} SET {', '.join(asignaciones)} "
+        f"WHERE {columna('id')} = ANY(%s) AND {columna('estado')} = ANY(%s) RETURNING *"
+    )
+    solicitudes = list(SolicitudAsesoramiento.objects.raw(sql, params + [ids, list(origenes)]))
+    prefetch_related_objects(solicitudes, "empresa", "asesoramiento")
+    return solicitudes
+
+
+def conflictos_solicitudes(desde, hasta, asesoramiento_id=None, encargado_id=None):
+    """
+    Solicitudes aprobadas dentro de [desde, hasta] que se superponen con otra aprobada
+    del mismo asesoramiento (y por lo tanto de sus encargados). Una sola consulta:
+    cada fila trae los ids en conflicto y los encargados como arrays (operador && + GiST).
+    """
+    rango = DateRange(desde, hasta, "[]")
+    aprobadas = SolicitudAsesoramiento.objects.filter(estado="APROBADO")
+
+    qs = aprobadas.filter(periodo__overlap=rango)
+    if asesoramiento_id:
+        qs = qs.filter(asesoramiento_id=asesoramiento_id)
+    if encargado_id:
+        qs = qs.filter(asesoramiento__encargados_asesoramiento__id=encargado_id)
+
+    superpuestas = aprobadas.filter(
+        asesoramiento_id=OuterRef("asesoramiento_id"),
+        periodo__overlap=OuterRef("periodo"),
+    ).exclude(id=OuterRef("id"))
+
+    return list(
+        qs.filter(Exists(superpuestas))
+        .annotate(
+            conflictos=ArraySubquery(superpuestas.order_by("id").values("id")),
+            encargados=ArraySubquery(
+                EncargadoAsesoramiento.objects.filter(
+                    asesoramiento_id=OuterRef("asesoramiento_id"), is_active=True
+                )
+                .order_by("nombre")
+                .values("nombre")
+            ),
+        )
+        .order_by("fechaAprobada", "asesoramiento_id", "id")
+        .values(
+            "id", "empresa_id", "empresa__nombre", "asesoramiento_id", "asesoramiento__nombre",
+            "fechaAprobada", "conflictos", "encargados",
+        )
+    )
+
+
+def calendario_solicitudes(desde, hasta, asesoramiento_id=None):
+    """
+    Carga por día en [desde, hasta]: solicitudes aprobadas y pendientes cuyo periodo
+    contiene el día. generate_series + LEFT JOIN sobre el índice GiST de 'periodo'.
+    """
+    opts = SolicitudAsesoramiento._meta
+    filtro_asesoramiento = ""
+    params = [desde, hasta]
+    if asesoramiento_id:
+        filtro_asesoramiento = "AND s.asesoramiento_id = %s"
+        params.append(asesoramiento_id)
+
+    sql = f"""
+        SELECT dia::date AS fecha,
+               COUNT(s.id) FILTER (WHERE s.estado = 'APROBADO') AS aprobadas,
+               COUNT(s.id) FILTER (WHERE s.estado = 'SOLICITADO') AS solicitadas
+        FROM generate_series(%s::date, %s::date, interval '1 day') AS dia
+        LEFT JOIN {connection.ops.quote_name(opts.db_table)} s
+               ON s.periodo @> dia::date
+              AND s.estado IN ('APROBADO', 'SOLICITADO')
+              {filtro_asesoramiento}
+        GROUP BY dia
+        ORDER BY dia
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {"fecha": fecha, "aprobadas": aprobadas, "solicitadas": solicitadas}
+            for fecha, aprobadas, solicitadas in cursor.fetchall()
+        ]
+
+
+# ============================
+#   RESUMEN DE INSCRIPCIONES
+# ============================
+# relacion -> (modelo, tabla N a N de Empresa)
+RELACIONES_INSCRIPCION = {
+    "capacitacion": (Capacitacion, Empresa.capacitaciones.through),
+    "asesoramiento": (Asesoramiento, Empresa.asesoramientos.through),
+}
+
+# dimension -> (campo de agrupación, campo de etiqueta) sobre la tabla N a N
+DIMENSIONES_INSCRIPCION = {
+    "total": (None, None),
+    "tipoSello": ("empresa__tipoSello_id", "empresa__tipoSello__nombre"),
+    "departamento": ("empresa__departamentos__nombre", None),
+    "gestion": ("empresa__fases_empresa__gestion", None),
+}
+
+
+def recalcular_resumen_inscripcion(relacion, ids=None):
+    """
+    Reconstruye ResumenInscripcion de las capacitaciones o asesoramientos indicados
+    (todos si ids es None) con una consulta agrupada por dimensión sobre la tabla N a N.
+    """
+    modelo, through = RELACIONES_INSCRIPCION[relacion]
+    campo = f"{relacion}_id"
+
+    existentes = modelo.objects.all()
+    if ids is not None:
+        existentes = existentes.filter(id__in=[i for i in ids if i])
+
+    with transaction.atomic():
+        # Bloquea los objetos: dos recálculos concurrentes del mismo objeto se serializan
+        # y el segundo lee lo que confirmó el primero
+        ids = set(existentes.select_for_update().order_by("id").values_list("id", flat=True))
+        if not ids:
+            return
+
+        inscripciones = through.objects.filter(**{f"{campo}__in": ids})
+        filas = []
+        for dimension, (agrupar, etiqueta) in DIMENSIONES_INSCRIPCION.items():
+            campos = [campo] + [c for c in (agrupar, etiqueta) if c]
+            qs = inscripciones
+            if agrupar and dimension != "tipoSello":
+                qs = qs.filter(**{f"{agrupar}__isnull": False})
+            for fila in qs.values(*campos).annotate(total=Count("empresa_id", distinct=True)).order_by():
+                valor = fila.get(agrupar) if agrupar else None
+                filas.append(ResumenInscripcion(
+                    **{campo: fila[campo]},
+                    dimension=dimension,
+                    valor="" if valor is None else str(valor),
+                    etiqueta=(fila.get(etiqueta) or "Sin sello") if etiqueta else "",
+                    empresas=fila["total"],
+                ))
+
+        ResumenInscripcion.objects.filter(**{f"{campo}__in": ids}).delete()
+        ResumenInscripcion.objects.bulk_create(filas)
+
+
+def recalcular_resumen_inscripcion_empresa(capacitacion_ids, asesoramiento_ids):
+    recalcular_resumen_inscripcion("capacitacion", capacitacion_ids)
+    recalcular_resumen_inscripcion("asesoramiento", asesoramiento_ids)
+
+
+def inscripciones_empresas(empresa_ids):
+    """
+    (ids de capacitaciones, ids de asesoramientos) en los que están inscritas las empresas.
+    """
+    return (
+        set(Empresa.capacitaciones.through.objects.filter(empresa_id__in=empresa_ids).values_list("capacitacion_id", flat=True)),
+        set(Empresa.asesoramientos.through.objects.filter(empresa_id__in=empresa_ids).values_list("asesoramiento_id", flat=True)),
+    )
+
+
+def refrescar_resumen_empresas(empresa_ids):
+    """
+    Programa, al confirmar la transacción, el recálculo del resumen de todo lo que
+    inscribieron esas empresas.
+    """
+    empresa_ids = {e for e in empresa_ids if e}
+    if not empresa_ids:
+        return
+    capacitaciones, asesoramientos = inscripciones_empresas(empresa_ids)
+    if capacitaciones or asesoramientos:
+        transaction.on_commit(lambda: recalcular_resumen_inscripcion_empresa(capacitaciones, asesoramientos))
+
+
+def resumen_inscripciones(relacion, objeto_id=None):
+    """
+    Lee la tabla de resumen y la agrupa como
+    [{"id": n, "total": x, "tipoSello": [...], "departamento": [...], "gestion": [...]}].
+    """
+    campo = f"{relacion}_id"
+    qs = ResumenInscripcion.objects.filter(**{f"{campo}__isnull": False})
+    if objeto_id:
+        qs = qs.filter(**{campo: objeto_id})
+
+    resumen = {}
+    for fila in qs.order_by(campo, "dimension", "-empresas", "valor").values(
+        campo, "dimension", "valor", "etiqueta", "empresas"
+    ):
+        item = resumen.setdefault(
+            fila[campo], {"id": fila[campo], "total": 0, "tipoSello": [], "departamento": [], "gestion": []}
+        )
+        if fila["dimension"] == "total":
+            item["total"] = fila["empresas"]
+        else:
+            item[fila["dimension"]].append({
+                "valor": fila["valor"] or None,
+                "etiqueta": fila["etiqueta"] or fila["valor"],
+                "empresas": fila["empresas"],
+            })
+    return list(resumen.values())
+
+
+# ============================
+#   IMPORTACIÓN DE EMPRESAS
+# ============================
+COLUMNAS_USUARIO = ("username", "email", "password", "rol")
+LONGITUDES = {"nombre": 255, "matricula": 100, "nit": 100, "tipo": 100, "username": 150}
+
+
+def leer_filas_csv(archivo, tamano_lote=500):
+    """
+    Lee el CSV en streaming y entrega lotes de (numero_fila, fila) con columnas en
+    minúscula y valores sin espacios. La fila 1 es la cabecera.
+    """
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    lector = csv.DictReader(texto)
+    lector.fieldnames = [(c or "").strip().lower() for c in (lector.fieldnames or [])]
+    if "matricula" not in lector.fieldnames:
+        raise ValueError("El archivo debe tener una cabecera con la columna 'matricula'.")
+    lote = []
+    for numero, fila in enumerate(lector, start=2):
+        lote.append((numero, {k: (v or "").strip() for k, v in fila.items() if k}))
+        if len(lote) >= tamano_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def hashear_passwords(passwords):
+    """
+    PBKDF2 en paralelo. hashlib libera el GIL durante el cálculo, así que un pool de
+    hilos usa todos los núcleos sin crear procesos dentro del worker de Celery.
+    Una contraseña vacía produce un password inutilizable.
+    """
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        return list(executor.map(lambda p: make_password(p or None), passwords))
+
+
+class ImportadorEmpresas:
+    """
+    Valida e inserta lotes de filas. Recuerda lo creado en lotes anteriores para que
+    varias filas con la misma matrícula agreguen representantes a una sola empresa.
+    """
+
+    def __init__(self):
+        self.empresas = {}  # matricula -> id de las empresas creadas en esta importación
+        self.nits = set()
+        self.emails = set()
+        self.usernames = set()
+        self.roles = {r.name.lower(): r.id for r in Role.objects.filter(is_active=True)}
+
+    def procesar_lote(self, lote):
+        """
+        Devuelve (empresas_creadas, usuarios_creados, errores) del lote.
+        """
+        matriculas = {f["matricula"] for _, f in lote if f.get("matricula")}
+        nits = {f["nit"] for _, f in lote if f.get("nit")}
+        emails = {f["email"].lower() for _, f in lote if f.get("email")}
+        usernames = {f["username"] for _, f in lote if f.get("username")}
+
+        # Una consulta por clave única para todo el lote
+        matriculas_bd = set(Empresa.objects.filter(matricula__in=matriculas).values_list("matricula", flat=True))
+        nits_bd = set(Empresa.objects.filter(nit__in=nits).values_list("nit", flat=True))
+        emails_bd = set(User.objects.filter(email__in=emails).values_list("email", flat=True))
+        usernames_bd = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+
+        errores = []
+        nuevas = {}  # matricula -> Empresa por crear en este lote
+        # Claves de este lote: pasan a self.* solo si el lote se confirma
+        lote_nits, lote_emails, lote_usernames = set(), set(), set()
+        filas_usuario = []  # (matricula, datos)
+        for numero, fila in lote:
+            errores_fila = []
+            matricula = fila.get("matricula", "")
+            email = fila.get("email", "").lower()
+            username = fila.get("username", "")
+
+            for campo, maximo in LONGITUDES.items():
+                if len(fila.get(campo, "")) > maximo:
+                    errores_fila.append(f"'{campo}' supera los {maximo} caracteres.")
+
+            empresa_nueva = None
+            if not matricula:
+                errores_fila.append("La matrícula es obligatoria.")
+            elif matricula not in self.empresas and matricula not in nuevas:
+                if matricula in matriculas_bd:
+                    errores_fila.append(f"Ya existe una empresa con matrícula '{matricula}'.")
+                if not fila.get("nombre") or not fila.get("tipo"):
+                    errores_fila.append("Nombre y tipo son obligatorios para una empresa nueva.")
+                nit = fila.get("nit") or None
+                if nit and (nit in nits_bd or nit in self.nits or nit in lote_nits):
+                    errores_fila.append(f"Ya existe una empresa con NIT '{nit}'.")
+                empresa_nueva = Empresa(
+                    nombre=fila.get("nombre", ""),
+                    matricula=matricula,
+                    nit=nit,
+                    tipo=fila.get("tipo", ""),
+                    direccion=fila.get("direccion") or None,
+                )
+
+            datos_usuario = None
+            if any(fila.get(c) for c in COLUMNAS_USUARIO):
+                try:
+                    validate_email(email)
+                except ValidationError:
+                    errores_fila.append(f"Email inválido: '{email}'.")
+                if email in emails_bd or email in self.emails or email in lote_emails:
+                    errores_fila.append(f"Ya existe un usuario con email '{email}'.")
+                if not username:
+                    errores_fila.append("El username es obligatorio para el usuario.")
+                elif username in usernames_bd or username in self.usernames or username in lote_usernames:
+                    errores_fila.append(f"Ya existe un usuario con username '{username}'.")
+                rol = fila.get("rol", "").lower()
+                if rol and rol not in self.roles:
+                    errores_fila.append(f"El rol '{fila['rol']}' no existe o está inactivo.")
+                datos_usuario = {
+                    "username": username,
+                    "email": email,
+                    "password": fila.get("password", ""),
+                    "role_id": self.roles.get(rol),
+                }
+
+            if errores_fila:
+                errores.append({"fila": numero, "errores": errores_fila})
+                continue
+
+            if empresa_nueva:
+                nuevas[matricula] = empresa_nueva
+                if empresa_nueva.nit:
+                    lote_nits.add(empresa_nueva.nit)
+            if datos_usuario:
+                lote_emails.add(email)
+                lote_usernames.add(username)
+                filas_usuario.append((matricula, datos_usuario))
+
+        hashes = hashear_passwords([datos["password"] for _, datos in filas_usuario])
+
+        with transaction.atomic():
+            creadas = Empresa.objects.bulk_create(list(nuevas.values()))
+            ids = dict(self.empresas)
+            ids.update({empresa.matricula: empresa.id for empresa in creadas})
+            usuarios = User.objects.bulk_create([
+                User(
+                    username=datos["username"],
+                    email=datos["email"],
+                    password=password,
+                    role_id=datos["role_id"],
+                    empresa_id=ids[matricula],
+                )
+                for (matricula, datos), password in zip(filas_usuario, hashes)
+            ])
+        self.empresas = ids
+        self.nits |= lote_nits
+        self.emails |= lote_emails
+        self.usernames |= lote_usernames
+
+        return len(creadas), len(usuarios), errores
@@ -6,13 +6,17 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
 # Django y librerías de terceros
-from django.db.models import Prefetch
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils.dateparse import parse_date
 
 # Módulos locales
 from accounts.models import User
 from accounts.serializers import UserSerializer
+from accounts.cache_http import respuesta_condicional
+from accounts.mixins import AccionesMasivasMixin
 from accounts.permissions import HasPermissionMap
-from accounts.utils import log_user_action
+from accounts.utils import log_user_action, user_has_perm_code
 from dashboard.models import Departamento
 from dashboard.serializers import DepartamentoSerializer
 from .models import (
@@ -24,24 +28,42 @@ from .models import (
     SolicitudAsesoramiento,
     PublicacionEmpresaComunidad,
     ArchivoAsesoramiento,
-    EncargadoAsesoramiento
+    EncargadoAsesoramiento,
+    ImportacionEmpresas,
+    TransicionFaseEmpresa
 )
 from .serializers import (
     CapacitacionSerializer,
+    EmpresaBusquedaSerializer,
+    EmpresaListSerializer,
     EmpresaSerializer,
     FaseEmpresaSerializer,
     AsesoramientoSerializer,
     SolicitudAsesoramientoSerializer,
     PublicacionEmpresaComunidadSerializer,
     ArchivoAsesoramientoSerializer,
-    EncargadoAsesoramientoSerializer
+    EncargadoAsesoramientoSerializer,
+    ImportacionEmpresasSerializer,
+    TransicionFaseEmpresaSerializer
+)
+from .task import enviar_solicitud_asesoramiento_email, importar_empresas
+from .utils import (
+    buscar_empresas,
+    cambiar_fase_empresa,
+    codificar_cursor,
+    decodificar_cursor,
+    calendario_solicitudes,
+    conflictos_solicitudes,
+    posibles_duplicados,
+    resumen_inscripciones,
+    transicionar_solicitudes,
 )
-from .task import enviar_solicitud_asesoramiento_email
 
-class EmpresaViewSet(viewsets.ModelViewSet):
+class EmpresaViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = Empresa.objects.all()
     serializer_class = EmpresaSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    nombre_masivo = "empresas"
     
     permission_code_map = {
         "list": "ver_empresas",
@@ -54,8 +76,49 @@ class EmpresaViewSet(viewsets.ModelViewSet):
         "listar_usuarios": "ver_empresas",
         "listar_departamentos": "ver_empresas",
         "aprobar": "aprobar_empresas",
+        "buscar": "ver_empresas",
+        "cambiar_fase": "cambiar_fase_empresas",
+        "historial_fases": "ver_empresas",
+        "en_fase": "ver_empresas",
     }
 
+    def get_serializer_class(self):
+        # El listado usa la representación compacta; el resto conserva el detalle completo
+        if self.action == "list":
+            return EmpresaListSerializer
+        return EmpresaSerializer
+
+    def get_queryset(self):
+        queryset = Empresa.objects.select_related("tipoSello")
+        if self.action == "list":
+            return queryset.order_by("nombre")
+        if self.action not in ("retrieve", "update", "partial_update"):
+            return queryset
+        # Prefetch acorde a lo que anida EmpresaSerializer (usuarios, fases, N a N y catálogo del sello)
+        return queryset.prefetch_related(
+            "usuarios",
+            "capacitaciones",
+            "asesoramientos",
+            Prefetch("fases_empresa", queryset=FaseEmpresa.objects.select_related("evaluador")),
+            "tipoSello__requisitos__inputs",
+            Prefetch(
+                "tipoSello__evaluaciones__evaluadores",
+                queryset=User.objects.select_related("role", "empresa"),
+            ),
+            "tipoSello__evaluaciones__fases__checklists",
+        )
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        # Marca posibles registros duplicados usando los mismos índices trigram de la búsqueda
+        response.data["posibles_duplicados"] = posibles_duplicados(
+            response.data["nombre"],
+            response.data.get("matricula"),
+            request.data.get("nit"),
+            excluir_id=response.data["id"],
+        )
+        return response
+
     def perform_create(self, serializer):
         empresa = serializer.save()
         log_user_action(self.request.user, f"Creó la empresa {empresa.nombre}")
@@ -108,6 +171,66 @@ class EmpresaViewSet(viewsets.ModelViewSet):
         serializer = FaseEmpresaSerializer(fases, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
+    @action(detail=True, methods=["post"], url_path="cambiar-fase")
+    def cambiar_fase(self, request, pk=None):
+        """
+        Mueve la empresa a otra fase en la gestión actual y registra la transición.
+        Espera en body: { "fase_numero": <n> }
+        """
+        gestion = request.COOKIES.get("gestion")
+        if not gestion:
+            return Response({"error": "No se pudo obtener la gestión de las cookies."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            fase_numero = int(request.data.get("fase_numero"))
+        except (TypeError, ValueError):
+            return Response({"error": "Debes enviar fase_numero como número"}, status=status.HTTP_400_BAD_REQUEST)
+        if fase_numero < 1:
+            return Response({"error": "fase_numero debe ser mayor o igual a 1"}, status=status.HTTP_400_BAD_REQUEST)
+
+        empresa = self.get_object()
+        fase, transicion = cambiar_fase_empresa(empresa, gestion, fase_numero, request.user)
+        if transicion:
+            log_user_action(
+                request.user,
+                f"Cambió la empresa {empresa.nombre} de la fase {transicion.fase_anterior} a la fase {fase_numero} ({gestion})",
+                request,
+            )
+        return Response(FaseEmpresaSerializer(fase).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"], url_path="historial-fases")
+    def historial_fases(self, request, pk=None):
+        """
+        Historial de cambios de fase de la empresa (filtrado por la gestión de la cookie si existe).
+        """
+        transiciones = TransicionFaseEmpresa.objects.filter(empresa_id=pk).select_related("evaluador")
+        gestion = request.COOKIES.get("gestion")
+        if gestion:
+            transiciones = transiciones.filter(gestion=gestion)
+        serializer = TransicionFaseEmpresaSerializer(transiciones, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="en-fase")
+    def en_fase(self, request):
+        """
+        Empresas que están en la fase indicada en la gestión actual.
+        URL: /api/v1/empresas/en-fase/?fase=2
+        """
+        gestion = request.COOKIES.get("gestion")
+        if not gestion:
+            return Response({"error": "No se pudo obtener la gestión de las cookies."}, status=status.HTTP_400_BAD_REQUEST)
+        fase = request.query_params.get("fase", "")
+        if not fase.isdigit():
+            return Response({"error": "Debes enviar el parámetro fase como número"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Usa el índice (gestion, fase_numero) de FaseEmpresa; hay una fila por empresa y gestión
+        empresas = (
+            Empresa.objects.filter(fases_empresa__gestion=gestion, fases_empresa__fase_numero=int(fase))
+            .select_related("tipoSello")
+            .order_by("nombre")
+        )
+        serializer = EmpresaListSerializer(empresas, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'], url_path='listar-departamentos')
     def listar_departamentos(self, request):
         """
@@ -118,6 +241,58 @@ class EmpresaViewSet(viewsets.ModelViewSet):
         serializer = DepartamentoSerializer(departamentos, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
+    @action(detail=False, methods=["get"], url_path="buscar")
+    def buscar(self, request):
+        """
+        Búsqueda difusa por nombre, matrícula o NIT ordenada por similitud, con paginación por cursor.
+        URL: /api/v1/empresas/buscar/?q=&tipoSello=&isAproved=&is_active=&departamento=&limit=&cursor=
+        """
+        texto = request.query_params.get("q", "").strip()
+
+        filtros = {
+            "tipoSello": request.query_params.get("tipoSello"),
+            "departamento": request.query_params.get("departamento"),
+        }
+        if filtros["tipoSello"] and not filtros["tipoSello"].isdigit():
+            return Response({"error": "tipoSello debe ser un id numérico"}, status=status.HTTP_400_BAD_REQUEST)
+        for campo in ("isAproved", "is_active"):
+            valor = request.query_params.get(campo)
+            if valor is not None:
+                if valor.lower() not in ("true", "false"):
+                    return Response({"error": f"{campo} debe ser true o false"}, status=status.HTTP_400_BAD_REQUEST)
+                filtros[campo] = valor.lower() == "true"
+
+        try:
+            limite = min(max(int(request.query_params.get("limit", 20)), 1), 100)
+        except ValueError:
+            return Response({"error": "limit debe ser un número"}, status=status.HTTP_400_BAD_REQUEST)
+
+        empresas = buscar_empresas(texto, filtros)
+        # Con texto se ordena por (similitud desc, id); sin texto por (nombre, id)
+        orden = ("-similitud", "id") if texto else ("nombre", "id")
+        empresas = empresas.order_by(*orden)
+
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            posicion = decodificar_cursor(cursor)
+            if posicion is None:
+                return Response({"error": "Cursor inválido"}, status=status.HTTP_400_BAD_REQUEST)
+            valor, ultimo_id = posicion
+            if texto:
+                empresas = empresas.filter(Q(similitud__lt=valor) | Q(similitud=valor, id__gt=ultimo_id))
+            else:
+                empresas = empresas.filter(Q(nombre__gt=valor) | Q(nombre=valor, id__gt=ultimo_id))
+
+        pagina = list(empresas[:limite + 1])
+        siguiente = None
+        if len(pagina) > limite:
+            pagina = pagina[:limite]
+            ultima = pagina[-1]
+            siguiente = codificar_cursor([ultima.similitud if texto else ultima.nombre, ultima.id])
+
+        serializer = EmpresaBusquedaSerializer(pagina, many=True)
+        return Response({"results": serializer.data, "next_cursor": siguiente}, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=["patch"], url_path="aprobar")
     def aprobar(self, request, pk=None):
         """
@@ -151,10 +326,12 @@ class EmpresaViewSet(viewsets.ModelViewSet):
 # ========================
 # ASESORAMIENTO
 # ========================
-class AsesoramientoViewSet(viewsets.ModelViewSet):
+class AsesoramientoViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = Asesoramiento.objects.all()
     serializer_class = AsesoramientoSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    accion_estado_masiva = "toggle_estado"
+    nombre_masivo = "asesoramientos"
 
     permission_code_map = {
         "list": "ver_asesoramientos",
@@ -167,6 +344,8 @@ class AsesoramientoViewSet(viewsets.ModelViewSet):
         "list_publicos": "ver_asesoramientos_publicos",
         "list_encargados_asesoramiento": "listar_encargados_asesoramiento",
         "list_archivos_asesoramiento": "listar_archivos_asesoramiento",
+        "inscripciones": "ver_asesoramientos",
+        "inscripciones_detalle": "ver_asesoramientos",
     }
     
     def perform_create(self, serializer):
@@ -193,8 +372,11 @@ class AsesoramientoViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"], url_path="publicos")
     def list_publicos(self, request):
         qs = Asesoramiento.objects.filter(is_active=True)
-        serializer = self.get_serializer(qs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return respuesta_condicional(
+            request,
+            [(qs, "updated_at")],
+            lambda: self.get_serializer(qs, many=True).data,
+        )
     
     @action(detail=True, methods=["get"], url_path="encargados")
     def list_encargados_asesoramiento(self, request, pk=None):
@@ -210,6 +392,21 @@ class AsesoramientoViewSet(viewsets.ModelViewSet):
         serializer = ArchivoAsesoramientoSerializer(archivos, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"], url_path="inscripciones")
+    def inscripciones(self, request):
+        """
+        Empresas inscritas por asesoramiento (total, por tipoSello, departamento y gestión).
+        """
+        return Response(resumen_inscripciones("asesoramiento"), status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"], url_path="inscripciones", url_name="inscripciones-detalle")
+    def inscripciones_detalle(self, request, pk=None):
+        asesoramiento = self.get_object()
+        resumen = resumen_inscripciones("asesoramiento", asesoramiento.id)
+        if not resumen:
+            resumen = [{"id": asesoramiento.id, "total": 0, "tipoSello": [], "departamento": [], "gestion": []}]
+        return Response(resumen[0], status=status.HTTP_200_OK)
+
 
 # ========================
 # SOLICITUD DE ASESORAMIENTO
@@ -226,62 +423,193 @@ class SolicitudAsesoramientoViewSet(viewsets.ModelViewSet):
         "rechazar": "rechazar_solicitudes_asesoramiento",
         "completar": "completar_solicitudes_asesoramiento",  # Nuevo permiso
         "cancelar": "cancelar_solicitudes_asesoramiento",    # Nuevo permiso
+        "transicion_masiva": None,  # Se valida según el estado destino
+        "conflictos": "ver_solicitudes_asesoramiento",
+        "calendario": "ver_solicitudes_asesoramiento",
     }
 
-    @action(detail=True, methods=["patch"])
-    def aprobar(self, request, pk=None):
-        solicitud = self.get_object()
-        fecha = request.data.get("fechaAprobada")
+    # Máximo de días para las consultas de agenda (conflictos / calendario)
+    MAX_DIAS_AGENDA = 366
+
+    # Estado destino de cada acción y mensaje de auditoría
+    ACCIONES_ESTADO = {
+        "aprobar": ("APROBADO", "Aprobó"),
+        "rechazar": ("RECHAZADO", "Rechazó"),
+        "completar": ("COMPLETADO", "Marcó como completada"),
+        "cancelar": ("CANCELADO", "Canceló"),
+    }
 
+    def _notificar_transicion(self, solicitudes, estado):
+        """
+        Efectos secundarios de una transición real: correo (si corresponde) tras el commit.
+        """
+        if estado in SolicitudAsesoramiento.ESTADOS_CON_CORREO:
+            for solicitud in solicitudes:
+                transaction.on_commit(lambda sid=solicitud.id: enviar_solicitud_asesoramiento_email.delay(sid))
+
+    def _fecha_aprobada(self, request, estado):
+        """
+        Devuelve (fecha, error_response). Solo 'APROBADO' exige fechaAprobada.
+        """
+        if estado != "APROBADO":
+            return None, None
+        fecha = request.data.get("fechaAprobada")
         if not fecha:
+            return None, Response({"error": "Debe proporcionar una fechaAprobada"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            fecha_aprobada = parse_date(str(fecha))
+        except ValueError:
+            fecha_aprobada = None
+        if not fecha_aprobada:
+            return None, Response({"error": "fechaAprobada debe tener el formato YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        return fecha_aprobada, None
+
+    def _transicionar(self, request, pk):
+        estado, verbo = self.ACCIONES_ESTADO[self.action]
+        solicitud = self.get_object()
+        fecha_aprobada, error = self._fecha_aprobada(request, estado)
+        if error:
+            return error
+
+        actualizadas = transicionar_solicitudes([solicitud.id], estado, fecha_aprobada)
+        if not actualizadas:
             return Response(
-                {"error": "Debe proporcionar una fechaAprobada"},
-                status=status.HTTP_400_BAD_REQUEST
+                {"error": f"No se puede pasar de {solicitud.estado} a {estado}."},
+                status=status.HTTP_409_CONFLICT,
             )
 
-        solicitud.estado = "APROBADO"
-        solicitud.fechaAprobada = fecha
-        solicitud.save()
-
-        # Llamada al task para enviar el correo
-        enviar_solicitud_asesoramiento_email.delay(solicitud.id)
-
+        solicitud = actualizadas[0]
+        self._notificar_transicion(actualizadas, estado)
+        log_user_action(request.user, f"{verbo} la solicitud de asesoramiento para la empresa '{solicitud.empresa.nombre}'", request)
         return Response(SolicitudAsesoramientoSerializer(solicitud).data)
 
     @action(detail=True, methods=["patch"])
-    def rechazar(self, request, pk=None):
-        solicitud = self.get_object()
-        solicitud.estado = "RECHAZADO"
-        solicitud.save()
-
-        enviar_solicitud_asesoramiento_email.delay(solicitud.id)
+    def aprobar(self, request, pk=None):
+        return self._transicionar(request, pk)
 
-        return Response(SolicitudAsesoramientoSerializer(solicitud).data)
+    @action(detail=True, methods=["patch"])
+    def rechazar(self, request, pk=None):
+        return self._transicionar(request, pk)
 
     @action(detail=True, methods=["patch"])
     def completar(self, request, pk=None):
-        solicitud = self.get_object()
-        solicitud.estado = "COMPLETADO"
-        solicitud.save()
-        log_user_action(request.user, f"Marcó como completada la solicitud de asesoramiento para la empresa '{solicitud.empresa.nombre}'", self.request)
-        
         # No se envía correo electrónico, solo se actualiza el estado.
-        return Response(SolicitudAsesoramientoSerializer(solicitud).data)
+        return self._transicionar(request, pk)
 
     @action(detail=True, methods=["patch"])
     def cancelar(self, request, pk=None):
-        solicitud = self.get_object()
-        solicitud.estado = "CANCELADO"
-        solicitud.save()
-        log_user_action(request.user, f"Canceló la solicitud de asesoramiento para la empresa '{solicitud.empresa.nombre}'", self.request)
-
         # No se envía correo electrónico, solo se actualiza el estado.
-        return Response(SolicitudAsesoramientoSerializer(solicitud).data)
-    
-class PublicacionEmpresaComunidadViewSet(viewsets.ModelViewSet):
+        return self._transicionar(request, pk)
+
+    @action(detail=False, methods=["post"], url_path="transicion-masiva")
+    def transicion_masiva(self, request):
+        """
+        Aplica la misma transición a varias solicitudes con un solo UPDATE.
+        Espera en body: { "ids": [1, 2], "estado": "APROBADO", "fechaAprobada": "YYYY-MM-DD" }
+        Devuelve las solicitudes actualizadas y los ids omitidos (estado no válido o inexistentes).
+        """
+        estado = request.data.get("estado")
+        acciones = {destino: accion for accion, (destino, _) in self.ACCIONES_ESTADO.items()}
+        if estado not in acciones:
+            return Response({"error": f"estado debe ser uno de {', '.join(acciones)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Mismo permiso que la acción individual equivalente
+        if not user_has_perm_code(request.user, self.permission_code_map[acciones[estado]]):
+            return Response({"detail": "No tiene permiso para realizar esta acción."}, status=status.HTTP_403_FORBIDDEN)
+
+        ids = request.data.get("ids")
+        if not isinstance(ids, list) or not ids or not all(str(i).isdigit() for i in ids):
+            return Response({"error": "ids debe ser una lista de ids numéricos"}, status=status.HTTP_400_BAD_REQUEST)
+        fecha_aprobada, error = self._fecha_aprobada(request, estado)
+        if error:
+            return error
+
+        actualizadas = transicionar_solicitudes(ids, estado, fecha_aprobada)
+        ids_actualizadas = {s.id for s in actualizadas}
+        omitidas = sorted({int(i) for i in ids} - ids_actualizadas)
+
+        if actualizadas:
+            self._notificar_transicion(actualizadas, estado)
+            verbo = self.ACCIONES_ESTADO[acciones[estado]][1]
+            log_user_action(
+                request.user,
+                f"{verbo} {len(actualizadas)} solicitudes de asesoramiento",
+                request,
+                extra={"estado": estado, "ids": sorted(ids_actualizadas)},
+            )
+
+        return Response(
+            {
+                "actualizadas": SolicitudAsesoramientoSerializer(actualizadas, many=True).data,
+                "omitidas": omitidas,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def _rango_fechas(self, request):
+        """
+        Lee ?desde=&hasta= (YYYY-MM-DD). Devuelve (desde, hasta, error_response).
+        """
+        try:
+            desde = parse_date(request.query_params.get("desde", ""))
+            hasta = parse_date(request.query_params.get("hasta", ""))
+        except ValueError:
+            desde = hasta = None
+        if not desde or not hasta:
+            return None, None, Response(
+                {"error": "Debe enviar desde y hasta con el formato YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if desde > hasta:
+            return None, None, Response({"error": "desde no puede ser mayor que hasta"}, status=status.HTTP_400_BAD_REQUEST)
+        if (hasta - desde).days > self.MAX_DIAS_AGENDA:
+            return None, None, Response(
+                {"error": f"El rango no puede superar {self.MAX_DIAS_AGENDA} días"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return desde, hasta, None
+
+    @action(detail=False, methods=["get"], url_path="conflictos")
+    def conflictos(self, request):
+        """
+        Solicitudes aprobadas que se superponen con otra del mismo asesoramiento en el rango.
+        URL: /api/v1/solicitud-asesoramiento/conflictos/?desde=&hasta=&asesoramiento=&encargado=
+        """
+        desde, hasta, error = self._rango_fechas(request)
+        if error:
+            return error
+        asesoramiento_id = request.query_params.get("asesoramiento")
+        encargado_id = request.query_params.get("encargado")
+        if (asesoramiento_id and not asesoramiento_id.isdigit()) or (encargado_id and not encargado_id.isdigit()):
+            return Response({"error": "asesoramiento y encargado deben ser ids numéricos"}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = conflictos_solicitudes(desde, hasta, asesoramiento_id, encargado_id)
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="calendario")
+    def calendario(self, request):
+        """
+        Carga diaria (aprobadas y pendientes) en el rango, calculada en la base de datos.
+        URL: /api/v1/solicitud-asesoramiento/calendario/?desde=&hasta=&asesoramiento=
+        """
+        desde, hasta, error = self._rango_fechas(request)
+        if error:
+            return error
+        asesoramiento_id = request.query_params.get("asesoramiento")
+        if asesoramiento_id and not asesoramiento_id.isdigit():
+            return Response({"error": "asesoramiento debe ser un id numérico"}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = calendario_solicitudes(desde, hasta, asesoramiento_id)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class PublicacionEmpresaComunidadViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = PublicacionEmpresaComunidad.objects.all().order_by('-created_at')
     serializer_class = PublicacionEmpresaComunidadSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    accion_estado_masiva = "toggle"
+    campo_estado = "activo"
+    nombre_masivo = "publicaciones"
 
     permission_code_map = {
         "list": "ver_publicaciones_comunidad",
@@ -333,8 +661,11 @@ class PublicacionEmpresaComunidadViewSet(viewsets.ModelViewSet):
         if include_inactive not in ("1", "true", "yes"):
             qs = qs.filter(activo=True)
         qs = qs.order_by("-created_at")
-        serializer = self.get_serializer(qs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return respuesta_condicional(
+            request,
+            [(qs, "updated_at")],
+            lambda: self.get_serializer(qs, many=True).data,
+        )
 
 
 # ============================
@@ -364,10 +695,12 @@ class ArchivoAsesoramientoViewSet(viewsets.ModelViewSet):
 # ============================
 #   VISTA PARA ENCARGADOS DE ASESORAMIENTO
 # ============================
-class EncargadoAsesoramientoViewSet(viewsets.ModelViewSet):
+class EncargadoAsesoramientoViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = EncargadoAsesoramiento.objects.all().order_by("id")
     serializer_class = EncargadoAsesoramientoSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    accion_estado_masiva = "toggle_estado"
+    nombre_masivo = "encargados de asesoramiento"
 
     permission_code_map = {
         "list": "listar_encargados_asesoramiento",
@@ -400,10 +733,12 @@ class EncargadoAsesoramientoViewSet(viewsets.ModelViewSet):
         log_user_action(request.user, f"Cambió estado de Encargado de Asesoramiento '{encargado_as.nombre}' a '{status_message}'", request)
         return Response({'message': f'Encargado de Asesoramiento ahora está {status_message}.'}, status=status.HTTP_200_OK)
 
-class CapacitacionViewSet(viewsets.ModelViewSet):
+class CapacitacionViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = Capacitacion.objects.all().order_by("-created_at")
     serializer_class = CapacitacionSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    accion_estado_masiva = "toggle_estado"
+    nombre_masivo = "capacitaciones"
 
     permission_code_map = {
         "list": "ver_capacitaciones",
@@ -413,6 +748,8 @@ class CapacitacionViewSet(viewsets.ModelViewSet):
         "partial_update": "editar_capacitaciones",
         "destroy": "eliminar_capacitaciones",
         "toggle_estado": "editar_capacitaciones",
+        "inscripciones": "ver_capacitaciones",
+        "inscripciones_detalle": "ver_capacitaciones",
     }
 
     def perform_create(self, serializer):
@@ -454,4 +791,47 @@ class CapacitacionViewSet(viewsets.ModelViewSet):
             {"message": f"La capacitación '{capacitacion.nombre}' ahora está {estado}."},
             status=status.HTTP_200_OK
         )
-    
\ No newline at end of file
+
+    @action(detail=False, methods=["get"], url_path="inscripciones")
+    def inscripciones(self, request):
+        """
+        Empresas inscritas por capacitación (total, por tipoSello, departamento y gestión).
+        """
+        return Response(resumen_inscripciones("capacitacion"), status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"], url_path="inscripciones", url_name="inscripciones-detalle")
+    def inscripciones_detalle(self, request, pk=None):
+        capacitacion = self.get_object()
+        resumen = resumen_inscripciones("capacitacion", capacitacion.id)
+        if not resumen:
+            resumen = [{"id": capacitacion.id, "total": 0, "tipoSello": [], "departamento": [], "gestion": []}]
+        return Response(resumen[0], status=status.HTTP_200_OK)
+    
+
+# ============================
+# IMPORTACIÓN DE EMPRESAS
+# ============================
+class ImportacionEmpresasViewSet(viewsets.ModelViewSet):
+    """
+    Carga masiva de empresas y representantes desde CSV. POST guarda el archivo y
+    encola la importación (202); el estado y los errores por fila se consultan con GET.
+    Columnas: nombre, matricula, nit, tipo, direccion, username, email, password, rol.
+    """
+    queryset = ImportacionEmpresas.objects.all().order_by("-created_at")
+    serializer_class = ImportacionEmpresasSerializer
+    permission_classes = [IsAuthenticated, HasPermissionMap]
+    http_method_names = ["get", "post", "head", "options"]
+
+    permission_code_map = {
+        "list": "importar_empresas",
+        "retrieve": "importar_empresas",
+        "create": "importar_empresas",
+    }
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        importacion = serializer.save(solicitado_por=request.user)
+        importar_empresas.delay(importacion.id)
+        log_user_action(request.user, f"Inició la importación de empresas {importacion.id}", request)
+        return Response(self.get_serializer(importacion).data, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from requisitos.models import Requisito
+from requisitos.utils import recalcular_completitud
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice CompletitudPostulacion para todos los tipos de sello y gestiones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--gestion", help="Limita el recálculo a una gestión.")
+
+    def handle(self, *args, **options):
+        claves = Requisito.objects.values_list("tipoSello_id", "gestion").distinct()
+        if options.get("gestion"):
+            claves = claves.filter(gestion=options["gestion"])
+
+        total = 0
+        for tipo_sello_id, gestion in claves:
+            recalcular_completitud(tipo_sello_id, gestion)
+            total += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Completitud recalculada para {total} combinaciones de tipo de sello y gestión.")
+        )
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:53
+
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.dateparse import parse_date
+
+
+def parse_valor_tipado(input_type, valor):
+    # Copia de RequisitoInputValor.parse_valor_tipado al momento de esta migración
+    if valor in (None, ""):
+        return None, None
+    if input_type == "number":
+        try:
+            numero = Decimal(str(valor).strip().replace(",", "."))
+        except InvalidOperation:
+            return None, None
+        if not numero.is_finite() or abs(numero) >= Decimal(10) ** 16:
+            return None, None
+        return numero.quantize(Decimal("0.0001")), None
+    if input_type == "date":
+        try:
+            return None, parse_date(str(valor).strip()[:10])
+        except ValueError:
+            return None, None
+    return None, None
+
+
+def rellenar_valores_tipados(apps, schema_editor):
+    RequisitoInputValor = apps.get_model('requisitos', 'RequisitoInputValor')
+    qs = RequisitoInputValor.objects.filter(
+        requisito_input__input_type__in=['number', 'date']
+    ).select_related('requisito_input')
+    pendientes = []
+    for valor in qs.iterator(chunk_size=1000):
+        valor.valor_numero, valor.valor_fecha = parse_valor_tipado(
+            valor.requisito_input.input_type, valor.valor
+        )
+        pendientes.append(valor)
+        if len(pendientes) >= 1000:
+            RequisitoInputValor.objects.bulk_update(pendientes, ['valor_numero', 'valor_fecha'])
+            pendientes = []
+    if pendientes:
+        RequisitoInputValor.objects.bulk_update(pendientes, ['valor_numero', 'valor_fecha'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('preparacion', '0008_alter_empresa_nit'),
+        ('requisitos', '0010_alter_evaluaciondato_unique_together'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requisitoinputvalor',
+            name='valor_fecha',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='requisitoinputvalor',
+            name='valor_numero',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=20, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='requisitoinputvalor',
+            index=models.Index(fields=['requisito_input', 'gestion', 'valor_numero'], name='requisitos__requisi_ec3bf6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requisitoinputvalor',
+            index=models.Index(fields=['requisito_input', 'gestion', 'valor_fecha'], name='requisitos__requisi_10c4de_idx'),
+        ),
+        migrations.RunPython(rellenar_valores_tipados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('preparacion', '0008_alter_empresa_nit'),
+        ('requisitos', '0011_requisitoinputvalor_valor_tipado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompletitudPostulacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gestion', models.CharField(max_length=10)),
+                ('requeridos', models.PositiveIntegerField(default=0)),
+                ('respondidos', models.PositiveIntegerField(default=0)),
+                ('faltantes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completitud_postulacion', to='preparacion.empresa')),
+                ('tipoSello', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completitud_postulacion', to='requisitos.tiposello')),
+            ],
+            options={
+                'verbose_name': 'Completitud de Postulación',
+                'verbose_name_plural': 'Completitud de Postulaciones',
+                'indexes': [models.Index(fields=['tipoSello', 'gestion', 'faltantes'], name='requisitos__tipoSel_2b66df_idx')],
+                'unique_together': {('empresa', 'tipoSello', 'gestion')},
+            },
+        ),
+    ]
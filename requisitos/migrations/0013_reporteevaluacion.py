@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:56
+
+import django.db.models.deletion
+import requisitos.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('preparacion', '0008_alter_empresa_nit'),
+        ('requisitos', '0012_completitudpostulacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporteEvaluacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gestion', models.CharField(max_length=10)),
+                ('formato', models.CharField(choices=[('csv', 'CSV'), ('html', 'HTML')], default='csv', max_length=10)),
+                ('version', models.CharField(max_length=64)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('LISTO', 'Listo'), ('ERROR', 'Error')], default='PENDIENTE', max_length=20)),
+                ('hash_contenido', models.CharField(blank=True, max_length=64)),
+                ('archivo', models.FileField(blank=True, null=True, upload_to=requisitos.models.reporte_evaluacion_upload_path)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('empresa', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reportes_evaluacion', to='preparacion.empresa')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reportes_evaluacion', to=settings.AUTH_USER_MODEL)),
+                ('tipoSello', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reportes_evaluacion', to='requisitos.tiposello')),
+            ],
+            options={
+                'verbose_name': 'Reporte de Evaluación',
+                'verbose_name_plural': 'Reportes de Evaluación',
+                'indexes': [models.Index(fields=['gestion', 'empresa', 'tipoSello', 'formato', 'version'], name='requisitos__gestion_c893c7_idx')],
+            },
+        ),
+    ]
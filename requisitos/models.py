@@ -1,3 +1,4 @@
+from decimal import Decimal, InvalidOperation
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
@@ -5,6 +6,7 @@ from auditlog.registry import auditlog
 from accounts.models import User
 from django.utils import timezone
 from django.conf import settings
+from django.utils.dateparse import parse_date
 
 # Tipos de datos para los inputs de los requisitos
 INPUT_TYPES = (
@@ -179,14 +181,91 @@ class RequisitoInputValor(models.Model):
     valor = models.TextField(null=True, blank=True)  # único campo para guardar
     archivo = models.FileField(upload_to=requisito_file_upload_path, null=True, blank=True)
 
+    # Copias tipadas de 'valor' según RequisitoInput.input_type (para filtrar/ordenar en la DB)
+    valor_numero = models.DecimalField(max_digits=20, decimal_places=4, null=True, blank=True)
+    valor_fecha = models.DateField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("empresa", "requisito_input", "gestion")
+        indexes = [
+            models.Index(fields=["requisito_input", "gestion", "valor_numero"]),
+            models.Index(fields=["requisito_input", "gestion", "valor_fecha"]),
+        ]
 
     def __str__(self):
         return f"{self.requisito_input.label} - {self.usuario} ({self.gestion})"
 
+    @staticmethod
+    def parse_valor_tipado(input_type, valor):
+        """
+        Convierte el texto de 'valor' a (numero, fecha) según el tipo de input.
+        Devuelve None en la posición que no aplica o si el texto no es válido.
+        """
+        if valor in (None, ""):
+            return None, None
+        if input_type == "number":
+            try:
+                numero = Decimal(str(valor).strip().replace(",", "."))
+            except InvalidOperation:
+                return None, None
+            if not numero.is_finite() or abs(numero) >= Decimal(10) ** 16:
+                return None, None
+            return numero.quantize(Decimal("0.0001")), None
+        if input_type == "date":
+            try:
+                return None, parse_date(str(valor).strip()[:10])
+            except ValueError:
+                return None, None
+        return None, None
+
+    def actualizar_valor_tipado(self):
+        """
+        Rellena valor_numero/valor_fecha a partir de 'valor'.
+        Se debe llamar antes de bulk_create, que no pasa por save().
+        """
+        self.valor_numero, self.valor_fecha = self.parse_valor_tipado(
+            self.requisito_input.input_type, self.valor
+        )
+
+    def save(self, *args, **kwargs):
+        self.actualizar_valor_tipado()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "valor" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "valor_numero", "valor_fecha"}
+        super().save(*args, **kwargs)
+
+class CompletitudPostulacion(models.Model):
+    """
+    Índice precalculado del avance de la postulación de una empresa:
+    inputs obligatorios, respondidos y faltantes por (empresa, tipoSello, gestion).
+    Se mantiene desde requisitos/signals.py al escribir valores o inputs.
+    """
+    empresa = models.ForeignKey(
+        "preparacion.Empresa", on_delete=models.CASCADE, related_name="completitud_postulacion"
+    )
+    tipoSello = models.ForeignKey(
+        TipoSello, on_delete=models.CASCADE, related_name="completitud_postulacion"
+    )
+    gestion = models.CharField(max_length=10)
+    requeridos = models.PositiveIntegerField(default=0)
+    respondidos = models.PositiveIntegerField(default=0)
+    faltantes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Completitud de Postulación"
+        verbose_name_plural = "Completitud de Postulaciones"
+        unique_together = ("empresa", "tipoSello", "gestion")
+        indexes = [
+            models.Index(fields=["tipoSello", "gestion", "faltantes"]),
+        ]
+
+    def __str__(self):
+        return f"{self.empresa_id} - {self.respondidos}/{self.requeridos} ({self.gestion})"
+
+
 class EvaluacionDato(models.Model):
     """
     Guarda los datos de la evaluación de un checklist por un usuario.
@@ -223,6 +302,60 @@ class EvaluacionDato(models.Model):
 
 auditlog.register(EvaluacionDato)
 
+# ============================
+#   REPORTES DE EVALUACIÓN
+# ============================
+def reporte_evaluacion_upload_path(instance, filename):
+    return f"reportes/evaluacion/{filename}"
+
+
+class ReporteEvaluacion(models.Model):
+    """
+    Reporte de resultados generado por Celery. 'version' identifica el estado de los
+    EvaluacionDato usados; el archivo se guarda por el hash de su contenido, así que
+    dos reportes con los mismos datos comparten el mismo archivo en disco.
+    """
+    FORMATOS = (
+        ("csv", "CSV"),
+        ("html", "HTML"),
+    )
+    ESTADOS = (
+        ("PENDIENTE", "Pendiente"),
+        ("LISTO", "Listo"),
+        ("ERROR", "Error"),
+    )
+
+    empresa = models.ForeignKey(
+        "preparacion.Empresa", on_delete=models.CASCADE, null=True, blank=True, related_name="reportes_evaluacion"
+    )
+    tipoSello = models.ForeignKey(
+        TipoSello, on_delete=models.CASCADE, null=True, blank=True, related_name="reportes_evaluacion"
+    )
+    gestion = models.CharField(max_length=10)
+    formato = models.CharField(max_length=10, choices=FORMATOS, default="csv")
+    version = models.CharField(max_length=64)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="PENDIENTE")
+    hash_contenido = models.CharField(max_length=64, blank=True)
+    archivo = models.FileField(upload_to=reporte_evaluacion_upload_path, null=True, blank=True)
+    error = models.TextField(blank=True)
+    solicitado_por = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="reportes_evaluacion"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Reporte de Evaluación"
+        verbose_name_plural = "Reportes de Evaluación"
+        indexes = [
+            models.Index(fields=["gestion", "empresa", "tipoSello", "formato", "version"]),
+        ]
+
+    def __str__(self):
+        alcance = f"empresa {self.empresa_id}" if self.empresa_id else f"sello {self.tipoSello_id}"
+        return f"Reporte {self.formato} de {alcance} ({self.gestion}) - {self.estado}"
+
+
 # ============================
 #   ENLACES
 # ============================
@@ -1,8 +1,9 @@
 from django.db import IntegrityError
 from rest_framework import serializers
 # Importa los nuevos modelos
-from .models import RequisitoInputValor, TipoSello, Requisito, RequisitoInput, ChecklistEvaluacion, Evaluacion, EvaluacionFases, EvaluacionDato, Enlaces
-from preparacion.models import FaseEmpresa
+from .models import RequisitoInputValor, TipoSello, Requisito, RequisitoInput, ChecklistEvaluacion, Evaluacion, EvaluacionFases, EvaluacionDato, Enlaces, CompletitudPostulacion, ReporteEvaluacion
+from .utils import recalcular_completitud
+from preparacion.utils import iniciar_fase_empresa
 
 from accounts.models import User
 from django.db.models import Max
@@ -35,6 +36,8 @@ class RequisitoSerializer(serializers.ModelSerializer):
             RequisitoInput.objects.bulk_create([
                 RequisitoInput(requisito=requisito, **data) for data in inputs_data
             ])
+            # bulk_create no emite señales: se actualiza el índice de completitud aquí
+            recalcular_completitud(requisito.tipoSello_id, requisito.gestion)
         return requisito
 
     def update(self, instance, validated_data):
@@ -45,6 +48,7 @@ class RequisitoSerializer(serializers.ModelSerializer):
             RequisitoInput.objects.bulk_create([
                 RequisitoInput(requisito=instance, **data) for data in inputs_data
             ])
+            recalcular_completitud(instance.tipoSello_id, instance.gestion)
         return instance
 
 
@@ -59,10 +63,10 @@ class TipoSelloSerializer(serializers.ModelSerializer):
         
     def get_evaluaciones(self, obj):
         gestion = self.context.get("gestion")
+        # Se filtra en memoria para aprovechar el prefetch de 'evaluaciones' de las vistas
+        evaluaciones = obj.evaluaciones.all()
         if gestion:
-            evaluaciones = obj.evaluaciones.filter(gestion=gestion)
-        else:
-            evaluaciones = obj.evaluaciones.all()
+            evaluaciones = [evaluacion for evaluacion in evaluaciones if evaluacion.gestion == gestion]
         return EvaluacionSerializer(evaluaciones, many=True).data
 
 class TipoSelloSerializerWithoutAllRelations(serializers.ModelSerializer):
@@ -178,8 +182,8 @@ class RequisitoInputValorSerializer(serializers.ModelSerializer):
         model = RequisitoInputValor
         # Aquí agregamos 'empresa' a los campos, aunque será un campo de solo lectura
         # y se llenará automáticamente en el método validate.
-        fields = ["id", "requisito_input", "requisito_input_nombre", "valor", "archivo", "archivo_url", "created_at", "empresa"]
-        read_only_fields = ["id", "requisito_input_nombre", "archivo_url", "created_at", "empresa"]
+        fields = ["id", "requisito_input", "requisito_input_nombre", "valor", "valor_numero", "valor_fecha", "archivo", "archivo_url", "created_at", "empresa"]
+        read_only_fields = ["id", "requisito_input_nombre", "valor_numero", "valor_fecha", "archivo_url", "created_at", "empresa"]
 
     def get_archivo_url(self, obj):
         request = self.context.get("request")
@@ -199,6 +203,13 @@ class RequisitoInputValorSerializer(serializers.ModelSerializer):
                 if not data.get("valor"):
                     raise serializers.ValidationError({"valor": "Este campo es obligatorio."})
 
+        # Los inputs numéricos y de fecha deben poder guardarse en su columna tipada
+        if requisito_input.input_type in ("number", "date") and data.get("valor"):
+            if RequisitoInputValor.parse_valor_tipado(requisito_input.input_type, data["valor"]) == (None, None):
+                raise serializers.ValidationError(
+                    {"valor": f"El valor no es un {requisito_input.get_input_type_display().lower()} válido."}
+                )
+
         # 2. Validación de postulación única por empresa
         # Obtener la empresa del usuario
         user = self.context['request'].user
@@ -232,6 +243,54 @@ class RequisitoInputValorSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # El campo 'empresa' ya está en validated_data gracias al método validate
         return super().create(validated_data)
+
+
+class CompletitudPostulacionSerializer(serializers.ModelSerializer):
+    empresa_nombre = serializers.CharField(source="empresa.nombre", read_only=True)
+    tipoSello_nombre = serializers.CharField(source="tipoSello.nombre", read_only=True)
+    porcentaje = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CompletitudPostulacion
+        fields = [
+            "id", "empresa", "empresa_nombre", "tipoSello", "tipoSello_nombre", "gestion",
+            "requeridos", "respondidos", "faltantes", "porcentaje", "updated_at",
+        ]
+        read_only_fields = fields
+
+    def get_porcentaje(self, obj):
+        if not obj.requeridos:
+            return 100
+        return round(obj.respondidos * 100 / obj.requeridos, 2)
+
+
+class ReporteEvaluacionSerializer(serializers.ModelSerializer):
+    archivo_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReporteEvaluacion
+        fields = [
+            "id", "empresa", "tipoSello", "gestion", "formato", "version", "estado",
+            "hash_contenido", "archivo_url", "error", "created_at", "updated_at",
+        ]
+        read_only_fields = [
+            "id", "gestion", "version", "estado", "hash_contenido", "archivo_url", "error", "created_at", "updated_at",
+        ]
+
+    def get_archivo_url(self, obj):
+        request = self.context.get("request")
+        if obj.archivo and request:
+            return request.build_absolute_uri(obj.archivo.url)
+        return None
+
+    def validate(self, data):
+        if bool(data.get("empresa")) == bool(data.get("tipoSello")):
+            raise serializers.ValidationError(
+                {"detail": "Debe indicar solo una empresa o solo un tipo de sello."}
+            )
+        return data
+
+
 class EvaluacionDatoSerializer(serializers.ModelSerializer):
     class Meta:
         model = EvaluacionDato
@@ -289,8 +348,9 @@ class EvaluacionDatoSerializer(serializers.ModelSerializer):
             # Manejo de error en caso de problemas con la base de datos (p. ej., concurrencia)
             raise serializers.ValidationError(f"Error al intentar crear/actualizar el registro: {e}")
 
-        # Crea un registro en FaseEmpresa si no existe (mantenemos esta lógica)
-        FaseEmpresa.objects.get_or_create(empresa=instance.empresa, gestion=gestion)
+        # La fase inicial solo se asegura con el primer puntaje de cada checklist
+        if created:
+            iniciar_fase_empresa(instance.empresa_id, gestion)
         
         return instance
 
@@ -0,0 +1,63 @@
+# apps/requisitos/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from preparacion.models import Empresa
+from .models import Requisito, RequisitoInput, RequisitoInputValor
+from .utils import recalcular_completitud, recalcular_completitud_empresa
+
+
+# ============================
+#   COMPLETITUD DE POSTULACIÓN
+# ============================
+# Los recálculos se ejecutan al confirmar la transacción, así un borrado en
+# cascada (Empresa, TipoSello, Requisito) termina antes de volver a escribir el índice.
+
+@receiver([post_save, post_delete], sender=RequisitoInputValor)
+def actualizar_completitud_por_valor(sender, instance, **kwargs):
+    requisito_input_id, empresa_id, gestion = instance.requisito_input_id, instance.empresa_id, instance.gestion
+
+    def recalcular():
+        requisito = Requisito.objects.filter(inputs__id=requisito_input_id).only("tipoSello_id").first()
+        if requisito:
+            recalcular_completitud(requisito.tipoSello_id, gestion, [empresa_id])
+
+    transaction.on_commit(recalcular)
+
+
+@receiver([post_save, post_delete], sender=RequisitoInput)
+def actualizar_completitud_por_input(sender, instance, **kwargs):
+    requisito_id = instance.requisito_id
+
+    def recalcular():
+        requisito = Requisito.objects.filter(id=requisito_id).only("tipoSello_id", "gestion").first()
+        if requisito:
+            recalcular_completitud(requisito.tipoSello_id, requisito.gestion)
+
+    transaction.on_commit(recalcular)
+
+
+@receiver([post_save, post_delete], sender=Requisito)
+def actualizar_completitud_por_requisito(sender, instance, **kwargs):
+    tipo_sello_id, gestion = instance.tipoSello_id, instance.gestion
+    transaction.on_commit(lambda: recalcular_completitud(tipo_sello_id, gestion))
+
+
+@receiver(pre_save, sender=Empresa)
+def guardar_tipo_sello_previo(sender, instance, update_fields=None, **kwargs):
+    # Un guardado que no toca tipoSello no necesita la consulta
+    if instance.pk and (update_fields is None or "tipoSello" in update_fields or "tipoSello_id" in update_fields):
+        instance._tipo_sello_previo_id = (
+            Empresa.objects.filter(pk=instance.pk).values_list("tipoSello_id", flat=True).first()
+        )
+    else:
+        instance._tipo_sello_previo_id = instance.tipoSello_id
+
+
+@receiver(post_save, sender=Empresa)
+def actualizar_completitud_por_empresa(sender, instance, created, **kwargs):
+    # El índice depende solo de los requisitos de su tipoSello: recalcular si cambió
+    if not created and getattr(instance, "_tipo_sello_previo_id", None) == instance.tipoSello_id:
+        return
+    transaction.on_commit(lambda: recalcular_completitud_empresa(instance))
@@ -1,9 +1,15 @@
 # apps/requisitos/tasks.py
+import csv
+import hashlib
+import io
 from celery import shared_task
 from django.template.loader import render_to_string
 from django.core.mail import EmailMessage
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.conf import settings
-from .models import Evaluacion, TipoSello
+from .models import Evaluacion, TipoSello, ReporteEvaluacion
+from .utils import filas_reporte_evaluacion
 from accounts.models import User
 from accounts.utils import log_user_action
 
@@ -52,4 +58,68 @@ def enviar_evaluacion_email(evaluacion_id, evaluadores_ids):
         
     except Evaluacion.DoesNotExist:
         log_user_action(None, f"Tarea de Celery: Evaluación con ID {evaluacion_id} no encontrada.")
-        return "Evaluación no encontrada."
\ No newline at end of file
+        return "Evaluación no encontrada."
+
+@shared_task
+def generar_reporte_evaluacion(reporte_id):
+    """
+    Genera el archivo de un ReporteEvaluacion (CSV o HTML) y lo guarda por el hash
+    de su contenido; si ya existe un archivo idéntico en disco se reutiliza.
+    """
+    try:
+        reporte = ReporteEvaluacion.objects.select_related("empresa", "tipoSello").get(id=reporte_id)
+    except ReporteEvaluacion.DoesNotExist:
+        return f"Reporte {reporte_id} no encontrado."
+
+    try:
+        filas = filas_reporte_evaluacion(reporte.gestion, reporte.empresa_id, reporte.tipoSello_id)
+
+        if reporte.formato == "html":
+            titulo = (
+                f"Resultados de evaluación - {reporte.empresa.nombre}"
+                if reporte.empresa
+                else f"Resultados de evaluación - {reporte.tipoSello.nombre}"
+            )
+            contenido = render_to_string(
+                "reportes/evaluacion.html",
+                {"titulo": titulo, "gestion": reporte.gestion, "filas": filas},
+            ).encode("utf-8")
+        else:
+            salida = io.StringIO()
+            writer = csv.writer(salida)
+            writer.writerow([
+                "empresa_id", "empresa", "fase_id", "fase", "evaluador_id", "evaluador",
+                "checklists", "puntaje", "puntaje_maximo",
+            ])
+            for fila in filas:
+                writer.writerow([
+                    fila["empresa_id"],
+                    fila["empresa__nombre"],
+                    fila["checklist_evaluacion__evaluacion_fase_id"],
+                    fila["checklist_evaluacion__evaluacion_fase__nombre"],
+                    fila["usuario_id"],
+                    fila["usuario__email"],
+                    fila["checklists"],
+                    fila["puntaje_total"],
+                    fila["puntaje_maximo"],
+                ])
+            contenido = salida.getvalue().encode("utf-8-sig")
+
+        hash_contenido = hashlib.sha256(contenido).hexdigest()
+        ruta = reporte.archivo.field.generate_filename(reporte, f"{hash_contenido}.{reporte.formato}")
+        if not default_storage.exists(ruta):
+            ruta = default_storage.save(ruta, ContentFile(contenido))
+
+        reporte.archivo.name = ruta
+        reporte.hash_contenido = hash_contenido
+        reporte.estado = "LISTO"
+        reporte.error = ""
+        reporte.save(update_fields=["archivo", "hash_contenido", "estado", "error", "updated_at"])
+        return f"Reporte {reporte_id} generado."
+
+    except Exception as e:
+        reporte.estado = "ERROR"
+        reporte.error = str(e)
+        reporte.save(update_fields=["estado", "error", "updated_at"])
+        log_user_action(None, f"Tarea de Celery: Fallo al generar el reporte {reporte_id}. Error: {e}")
+        return f"Error al generar el reporte {reporte_id}."
@@ -2,7 +2,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
+    CompletitudPostulacionViewSet,
     EnlacesViewSet,
+    ReporteEvaluacionViewSet,
     EvaluacionDatoViewSet,
     RequisitoInputValorViewSet,
     TipoSelloViewSet, 
@@ -24,6 +26,8 @@ router.register(r'evaluacion-fases', EvaluacionFasesViewSet, basename='evaluacio
 router.register(r'requisitos-valores', RequisitoInputValorViewSet, basename='requisitos-valores')  # Nueva ruta
 router.register(r'evaluacion-dato', EvaluacionDatoViewSet, basename='evaluacion-dato')  # Nueva ruta
 router.register(r'enlaces', EnlacesViewSet, basename='enlaces')  # Nueva ruta
+router.register(r'reportes-evaluacion', ReporteEvaluacionViewSet, basename='reportes-evaluacion')
+router.register(r'completitud-postulacion', CompletitudPostulacionViewSet, basename='completitud-postulacion')
 
 # Las URL generadas por el router se incluyen en tu URL principal
 urlpatterns = [
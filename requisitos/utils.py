@@ -0,0 +1,250 @@
+# apps/requisitos/utils.py
+import csv
+import hashlib
+import io
+import os
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max, Q, Sum
+from django.utils.text import get_valid_filename
+
+from .models import (
+    CompletitudPostulacion,
+    EvaluacionDato,
+    Requisito,
+    RequisitoInput,
+    RequisitoInputValor,
+    TipoSello,
+)
+
+
+def recalcular_completitud(tipo_sello_id, gestion, empresa_ids=None):
+    """
+    Recalcula CompletitudPostulacion para un (tipoSello, gestion).
+    Si no se pasan empresa_ids se recalculan todas las empresas con ese sello
+    y las que ya tenían una fila para esa clave. Son pocas consultas y un upsert.
+    """
+    from preparacion.models import Empresa  # 👈 import lazy (preparacion importa requisitos)
+
+    if not tipo_sello_id or not gestion:
+        return
+    if not TipoSello.objects.filter(id=tipo_sello_id).exists():
+        return
+
+    if empresa_ids is None:
+        empresa_ids = set(
+            Empresa.objects.filter(tipoSello_id=tipo_sello_id).values_list("id", flat=True)
+        ) | set(
+            CompletitudPostulacion.objects.filter(
+                tipoSello_id=tipo_sello_id, gestion=gestion
+            ).values_list("empresa_id", flat=True)
+        )
+    else:
+        # Solo empresas que siguen existiendo (p. ej. tras un borrado en cascada)
+        empresa_ids = set(
+            Empresa.objects.filter(id__in=[e for e in empresa_ids if e]).values_list("id", flat=True)
+        )
+    if not empresa_ids:
+        return
+
+    requeridos_qs = RequisitoInput.objects.filter(
+        requisito__tipoSello_id=tipo_sello_id,
+        requisito__gestion=gestion,
+        requisito__is_active=True,
+        is_required=True,
+        is_active=True,
+    )
+    requeridos = requeridos_qs.count()
+
+    respondidos = dict(
+        RequisitoInputValor.objects.filter(
+            empresa_id__in=empresa_ids,
+            gestion=gestion,
+            requisito_input__in=requeridos_qs,
+        )
+        .filter((Q(valor__isnull=False) & ~Q(valor="")) | (Q(archivo__isnull=False) & ~Q(archivo="")))
+        .values("empresa_id")
+        .annotate(total=Count("requisito_input", distinct=True))
+        .values_list("empresa_id", "total")
+    )
+
+    CompletitudPostulacion.objects.bulk_create(
+        [
+            CompletitudPostulacion(
+                empresa_id=empresa_id,
+                tipoSello_id=tipo_sello_id,
+                gestion=gestion,
+                requeridos=requeridos,
+                respondidos=respondidos.get(empresa_id, 0),
+                faltantes=max(requeridos - respondidos.get(empresa_id, 0), 0),
+            )
+            for empresa_id in empresa_ids
+        ],
+        update_conflicts=True,
+        unique_fields=["empresa", "tipoSello", "gestion"],
+        update_fields=["requeridos", "respondidos", "faltantes", "updated_at"],
+    )
+
+
+def recalcular_completitud_empresa(empresa):
+    """
+    Rehace las filas de una empresa para su tipoSello actual (todas las gestiones con
+    requisitos) y elimina las de otros sellos, p. ej. tras aprobarla con un sello nuevo.
+    """
+    CompletitudPostulacion.objects.filter(empresa=empresa).exclude(
+        tipoSello_id=empresa.tipoSello_id
+    ).delete()
+    if not empresa.tipoSello_id:
+        return
+    gestiones = (
+        Requisito.objects.filter(tipoSello_id=empresa.tipoSello_id)
+        .values_list("gestion", flat=True)
+        .distinct()
+    )
+    for gestion in gestiones:
+        recalcular_completitud(empresa.tipoSello_id, gestion, [empresa.id])
+
+
+class _BufferZip:
+    """
+    Destino no posicionable para zipfile: acumula lo escrito hasta que el
+    generador lo entrega, así el ZIP nunca está completo en memoria ni en disco.
+    """
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, data):
+        self._partes.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        data = b"".join(self._partes)
+        self._partes.clear()
+        return data
+
+
+async def iterar_en_async(generador):
+    """
+    Entrega un generador síncrono parte por parte como generador asíncrono. Bajo
+    ASGI, StreamingHttpResponse convierte un iterador síncrono en lista antes de
+    enviar nada; así cada parte sale apenas se genera. Todas las llamadas corren
+    en el mismo hilo (thread_sensitive), igual que la conexión a la base.
+    """
+    fin = object()
+    siguiente = sync_to_async(next)
+    try:
+        while True:
+            parte = await siguiente(generador, fin)
+            if parte is fin:
+                break
+            if parte:
+                yield parte
+    finally:
+        await sync_to_async(generador.close)()
+
+
+def generar_zip_postulacion(valores, chunk_size=64 * 1024):
+    """
+    Genera por partes un ZIP con los archivos de los RequisitoInputValor recibidos
+    (queryset con select_related de empresa y requisito_input__requisito) y un
+    manifiesto.csv con los valores de texto, número y fecha.
+    """
+    buffer = _BufferZip()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        manifiesto = io.StringIO()
+        writer = csv.writer(manifiesto)
+        writer.writerow([
+            "empresa_id", "empresa", "requisito", "input", "tipo",
+            "valor", "valor_numero", "valor_fecha", "archivo",
+        ])
+
+        for valor in valores.iterator(chunk_size=500):
+            requisito_input = valor.requisito_input
+            empresa = valor.empresa
+            carpeta = get_valid_filename(f"{empresa.id}_{empresa.nombre}") if empresa else "sin_empresa"
+            ruta_archivo = ""
+
+            if valor.archivo:
+                ruta_archivo = "/".join([
+                    carpeta,
+                    get_valid_filename(requisito_input.requisito.nombre),
+                    get_valid_filename(f"{requisito_input.id}_{os.path.basename(valor.archivo.name)}"),
+                ])
+                try:
+                    with valor.archivo.open("rb") as origen, zf.open(ruta_archivo, "w", force_zip64=True) as destino:
+                        for chunk in origen.chunks(chunk_size):
+                            destino.write(chunk)
+                            yield buffer.vaciar()
+                except FileNotFoundError:
+                    ruta_archivo = "ARCHIVO NO ENCONTRADO"
+                yield buffer.vaciar()
+
+            writer.writerow([
+                empresa.id if empresa else "",
+                empresa.nombre if empresa else "",
+                requisito_input.requisito.nombre,
+                requisito_input.label,
+                requisito_input.input_type,
+                valor.valor or "",
+                valor.valor_numero if valor.valor_numero is not None else "",
+                valor.valor_fecha.isoformat() if valor.valor_fecha else "",
+                ruta_archivo,
+            ])
+
+        zf.writestr("manifiesto.csv", manifiesto.getvalue().encode("utf-8-sig"))
+    yield buffer.vaciar()
+
+
+# ============================
+#   REPORTES DE EVALUACIÓN
+# ============================
+def datos_evaluacion_alcance(gestion, empresa_id=None, tipo_sello_id=None):
+    """
+    EvaluacionDato de una empresa o de todas las empresas evaluadas en un tipo de sello.
+    """
+    qs = EvaluacionDato.objects.filter(gestion=gestion)
+    if empresa_id:
+        qs = qs.filter(empresa_id=empresa_id)
+    if tipo_sello_id:
+        qs = qs.filter(checklist_evaluacion__evaluacion_fase__evaluacion__tipoSello_id=tipo_sello_id)
+    return qs
+
+
+def version_datos_evaluacion(gestion, empresa_id=None, tipo_sello_id=None):
+    """
+    Versión barata de los datos de un reporte: cambia al crear, editar o borrar un
+    EvaluacionDato del alcance (COUNT + MAX(updated_at) en una sola consulta).
+    """
+    resumen = datos_evaluacion_alcance(gestion, empresa_id, tipo_sello_id).aggregate(
+        total=Count("id"), ultimo=Max("updated_at")
+    )
+    ultimo = resumen["ultimo"].isoformat() if resumen["ultimo"] else "-"
+    return hashlib.sha1(f"{resumen['total']}|{ultimo}".encode()).hexdigest()
+
+
+def filas_reporte_evaluacion(gestion, empresa_id=None, tipo_sello_id=None):
+    """
+    Puntajes agregados en la base de datos por empresa, fase de evaluación y evaluador.
+    """
+    return list(
+        datos_evaluacion_alcance(gestion, empresa_id, tipo_sello_id)
+        .values(
+            "empresa_id",
+            "empresa__nombre",
+            "checklist_evaluacion__evaluacion_fase_id",
+            "checklist_evaluacion__evaluacion_fase__nombre",
+            "usuario_id",
+            "usuario__email",
+        )
+        .annotate(
+            checklists=Count("id"),
+            puntaje_total=Sum("puntaje"),
+            puntaje_maximo=Sum("checklist_evaluacion__porcentaje"),
+        )
+        .order_by("empresa__nombre", "checklist_evaluacion__evaluacion_fase_id", "usuario__email")
+    )
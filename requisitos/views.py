@@ -2,7 +2,11 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.text import get_valid_filename
+from django.db.models import Avg, Count, Max, Min, Prefetch
 from preparacion.models import Empresa
 from accounts.serializers import UserSerializer
 from accounts.models import User
@@ -16,7 +20,9 @@ from .models import (
     ChecklistEvaluacion,
     Evaluacion,
     EvaluacionFases,
-    EvaluacionDato
+    EvaluacionDato,
+    CompletitudPostulacion,
+    ReporteEvaluacion
 )
 from .serializers import (
     EnlacesSerializer,
@@ -28,13 +34,18 @@ from .serializers import (
     EvaluacionSerializer,
     EvaluacionFasesSerializer,
     TipoSelloSerializerWithoutAllRelations,
-    EvaluacionDatoSerializer
+    EvaluacionDatoSerializer,
+    CompletitudPostulacionSerializer,
+    ReporteEvaluacionSerializer
 )
+from .utils import generar_zip_postulacion, iterar_en_async, recalcular_completitud, version_datos_evaluacion
+from accounts.cache_http import respuesta_condicional
+from accounts.mixins import AccionesMasivasMixin
 from accounts.permissions import HasPermissionMap
 from accounts.utils import log_user_action
 
 # Importación de la tarea de Celery
-from .task import enviar_evaluacion_email
+from .task import enviar_evaluacion_email, generar_reporte_evaluacion
 
 
 class TipoSelloViewSet(viewsets.ModelViewSet):
@@ -152,10 +163,11 @@ class RequisitoViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class RequisitoInputViewSet(viewsets.ModelViewSet):
+class RequisitoInputViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = RequisitoInput.objects.all()
     serializer_class = RequisitoInputSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    nombre_masivo = "inputs de requisito"
 
     permission_code_map = {
         "list": "listar_requisitos_input",
@@ -169,6 +181,20 @@ class RequisitoInputViewSet(viewsets.ModelViewSet):
         "get_tipos_sellos": "listar_requisitos_postulacion",
     }
 
+    def despues_accion_masiva(self, ids, operacion):
+        # El UPDATE masivo no dispara post_save: se recalcula la completitud de los sellos afectados
+        if operacion == "eliminar":
+            return
+        claves = list(
+            Requisito.objects.filter(inputs__id__in=ids).values_list("tipoSello_id", "gestion").distinct()
+        )
+
+        def recalcular():
+            for tipo_sello_id, gestion in claves:
+                recalcular_completitud(tipo_sello_id, gestion)
+
+        transaction.on_commit(recalcular)
+
     @action(
         detail=False,
         methods=["get"],
@@ -220,7 +246,15 @@ class RequisitoInputViewSet(viewsets.ModelViewSet):
         )
 
     def perform_update(self, serializer):
+        input_type_anterior = serializer.instance.input_type
         input_instance = serializer.save()
+        if input_instance.input_type != input_type_anterior:
+            # Las columnas tipadas dependen del input_type: se recalculan los valores ya enviados
+            valores = list(input_instance.valores.all())
+            for valor in valores:
+                valor.requisito_input = input_instance
+                valor.actualizar_valor_tipado()
+            RequisitoInputValor.objects.bulk_update(valores, ["valor_numero", "valor_fecha"], batch_size=1000)
         log_user_action(
             self.request.user,
             f"Actualizó RequisitoInput: {input_instance.label}",
@@ -254,11 +288,12 @@ class RequisitoInputViewSet(viewsets.ModelViewSet):
         )
 
 
-class ChecklistEvaluacionViewSet(viewsets.ModelViewSet):
+class ChecklistEvaluacionViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     # El serializador ya maneja la relación
     queryset = ChecklistEvaluacion.objects.all()
     serializer_class = ChecklistEvaluacionSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    nombre_masivo = "checklists de evaluación"
 
     permission_code_map = {
         "list": "listar_checklist_evaluacion",
@@ -316,10 +351,11 @@ class ChecklistEvaluacionViewSet(viewsets.ModelViewSet):
 
 
 # Nuevo ViewSet para las fases de evaluación
-class EvaluacionFasesViewSet(viewsets.ModelViewSet):
+class EvaluacionFasesViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = EvaluacionFases.objects.all().prefetch_related("checklists")
     serializer_class = EvaluacionFasesSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    nombre_masivo = "fases de evaluación"
 
     permission_code_map = {
         "list": "listar_fases_evaluacion",
@@ -528,6 +564,11 @@ class RequisitoInputValorViewSet(viewsets.ModelViewSet):
         "destroy": "eliminar_requisitos_input_valor",
         "get_postulacion_usuario": "ver_requisitos_input_valor",
         "get_evaluacion_datos": "ver_requisitos_input_valor",
+        "postulacion_masiva": "crear_requisitos_input_valor",
+        # Devuelven respuestas de todas las empresas: solo evaluadores/administradores
+        "valores_por_input": "analizar_requisitos_input_valor",
+        "estadisticas_input": "analizar_requisitos_input_valor",
+        "exportar_zip": "exportar_requisitos_input_valor",
     }
     
     def get_queryset(self):
@@ -599,6 +640,285 @@ class RequisitoInputValorViewSet(viewsets.ModelViewSet):
             gestion=gestion
         )
 
+    @action(detail=False, methods=["post"], url_path="postulacion-masiva")
+    def postulacion_masiva(self, request):
+        """
+        Recibe en un solo multipart todos los inputs de un requisito y los guarda
+        con un único INSERT ... ON CONFLICT (empresa, requisito_input, gestion).
+        Espera en body: requisito=<id>, valor_<input_id>=<texto> y archivo_<input_id>=<file>.
+        """
+        user = request.user
+        gestion = request.COOKIES.get("gestion")
+
+        if not hasattr(user, 'empresa') or not user.empresa:
+            return Response({"detail": "El usuario no está vinculado a una empresa."}, status=status.HTTP_400_BAD_REQUEST)
+        if not gestion:
+            return Response({"detail": "No se pudo obtener la gestión de las cookies."}, status=status.HTTP_400_BAD_REQUEST)
+
+        requisito_id = request.data.get("requisito")
+        if not requisito_id:
+            return Response({"detail": "El campo 'requisito' es requerido."}, status=status.HTTP_400_BAD_REQUEST)
+        if not str(requisito_id).isdigit():
+            return Response({"requisito": "Debe ser un id numérico."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 1. Todos los inputs activos del requisito en una sola consulta
+        inputs = {
+            inp.id: inp
+            for inp in RequisitoInput.objects.filter(requisito_id=requisito_id, is_active=True).select_related("requisito")
+        }
+        if not inputs:
+            return Response({"detail": "El requisito no tiene inputs activos."}, status=status.HTTP_404_NOT_FOUND)
+
+        # 2. Archivos ya enviados (un input de archivo obligatorio puede reutilizarlos)
+        archivos_previos = set(
+            RequisitoInputValor.objects.filter(
+                empresa=user.empresa,
+                gestion=gestion,
+                requisito_input_id__in=inputs.keys(),
+            ).exclude(archivo="").exclude(archivo__isnull=True).values_list("requisito_input_id", flat=True)
+        )
+
+        # 3. Validación en memoria contra RequisitoInput.is_required
+        errores = {}
+        valores = {}
+        archivos = {}
+        for input_id, inp in inputs.items():
+            if inp.input_type == "file":
+                archivo = request.FILES.get(f"archivo_{input_id}")
+                if archivo:
+                    archivos[input_id] = archivo
+                elif inp.is_required and input_id not in archivos_previos:
+                    errores[f"archivo_{input_id}"] = "Este archivo es obligatorio."
+            else:
+                valor = request.data.get(f"valor_{input_id}")
+                if valor not in (None, ""):
+                    if inp.input_type in ("number", "date") and RequisitoInputValor.parse_valor_tipado(
+                        inp.input_type, valor
+                    ) == (None, None):
+                        errores[f"valor_{input_id}"] = f"El valor no es un {inp.get_input_type_display().lower()} válido."
+                    else:
+                        valores[input_id] = valor
+                elif inp.is_required:
+                    errores[f"valor_{input_id}"] = "Este campo es obligatorio."
+
+        if errores:
+            return Response(errores, status=status.HTTP_400_BAD_REQUEST)
+
+        # 4. Los archivos ya vienen en chunks desde el upload handler; se copian al storage por chunks
+        archivo_field = RequisitoInputValor._meta.get_field("archivo")
+        con_archivo = []
+        guardados = []
+        try:
+            for input_id, archivo in archivos.items():
+                obj = RequisitoInputValor(
+                    usuario=user, empresa=user.empresa, requisito_input=inputs[input_id], gestion=gestion
+                )
+                nombre = archivo_field.generate_filename(obj, archivo.name)
+                obj.archivo.name = archivo_field.storage.save(nombre, archivo, max_length=archivo_field.max_length)
+                guardados.append(obj.archivo.name)
+                con_archivo.append(obj)
+
+            sin_archivo = [
+                RequisitoInputValor(
+                    usuario=user, empresa=user.empresa, requisito_input=inputs[input_id], gestion=gestion, valor=valor
+                )
+                for input_id, valor in valores.items()
+            ]
+            for obj in sin_archivo:
+                obj.actualizar_valor_tipado()
+
+            unique_fields = ["empresa", "requisito_input", "gestion"]
+            with transaction.atomic():
+                if sin_archivo:
+                    RequisitoInputValor.objects.bulk_create(
+                        sin_archivo,
+                        update_conflicts=True,
+                        unique_fields=unique_fields,
+                        update_fields=["valor", "valor_numero", "valor_fecha", "usuario"],
+                    )
+                if con_archivo:
+                    # Archivos que el upsert reemplaza: se borran del storage tras el commit
+                    reemplazados = [
+                        nombre
+                        for nombre in RequisitoInputValor.objects.select_for_update()
+                        .filter(empresa=user.empresa, gestion=gestion, requisito_input_id__in=archivos.keys())
+                        .exclude(archivo="")
+                        .exclude(archivo__isnull=True)
+                        .values_list("archivo", flat=True)
+                        if nombre not in guardados
+                    ]
+                    def borrar_reemplazados():
+                        for nombre in reemplazados:
+                            archivo_field.storage.delete(nombre)
+
+                    if reemplazados:
+                        transaction.on_commit(borrar_reemplazados)
+                    RequisitoInputValor.objects.bulk_create(
+                        con_archivo,
+                        update_conflicts=True,
+                        unique_fields=unique_fields,
+                        update_fields=["archivo", "usuario"],
+                    )
+        except Exception:
+            # Si la escritura falla no se dejan archivos huérfanos en el storage
+            for nombre in guardados:
+                archivo_field.storage.delete(nombre)
+            raise
+
+        # bulk_create no emite señales: se actualiza el índice de completitud aquí
+        requisito = next(iter(inputs.values())).requisito
+        recalcular_completitud(requisito.tipoSello_id, gestion, [user.empresa.id])
+
+        log_user_action(
+            user,
+            f"Envió la postulación del requisito {requisito_id} ({len(sin_archivo) + len(con_archivo)} valores)",
+            request,
+        )
+
+        qs = RequisitoInputValor.objects.filter(
+            empresa=user.empresa,
+            gestion=gestion,
+            requisito_input_id__in=inputs.keys(),
+        ).select_related("requisito_input")
+        serializer = self.get_serializer(qs, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def _filtrar_valores_tipados(self, request, requisito_input_id):
+        """
+        Devuelve (requisito_input, columna_tipada, queryset) con los valores de todas las
+        empresas para el input en la gestión de la cookie, aplicando ?desde= y ?hasta=.
+        """
+        gestion = request.COOKIES.get("gestion")
+        if not gestion:
+            return None, None, Response({"detail": "La gestión es requerida."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            requisito_input = RequisitoInput.objects.get(id=requisito_input_id)
+        except RequisitoInput.DoesNotExist:
+            return None, None, Response({"detail": "El input no existe."}, status=status.HTTP_404_NOT_FOUND)
+
+        columnas = {"number": "valor_numero", "date": "valor_fecha"}
+        columna = columnas.get(requisito_input.input_type)
+        if not columna:
+            return None, None, Response(
+                {"detail": "Solo los inputs de tipo número o fecha admiten filtros por rango."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        qs = RequisitoInputValor.objects.filter(requisito_input=requisito_input, gestion=gestion)
+        for param, lookup in (("desde", "gte"), ("hasta", "lte")):
+            texto = request.query_params.get(param)
+            if texto in (None, ""):
+                continue
+            numero, fecha = RequisitoInputValor.parse_valor_tipado(requisito_input.input_type, texto)
+            limite = numero if columna == "valor_numero" else fecha
+            if limite is None:
+                return None, None, Response(
+                    {"detail": f"El parámetro '{param}' no es válido para este input."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            qs = qs.filter(**{f"{columna}__{lookup}": limite})
+        return requisito_input, columna, qs
+
+    @action(detail=False, methods=["get"], url_path=r"por-input/(?P<requisito_input_id>\d+)")
+    def valores_por_input(self, request, requisito_input_id=None):
+        """
+        Lista los valores de todas las empresas para un input numérico o de fecha.
+        Filtros: ?desde=&hasta= y orden con ?orden=asc|desc (por el valor tipado).
+        """
+        requisito_input, columna, qs = self._filtrar_valores_tipados(request, requisito_input_id)
+        if requisito_input is None:
+            return qs
+
+        orden = columna if request.query_params.get("orden", "asc") == "asc" else f"-{columna}"
+        data = qs.exclude(**{f"{columna}__isnull": True}).order_by(orden, "id").values(
+            "id", "empresa_id", "empresa__nombre", "valor", columna
+        )
+        return Response(
+            [
+                {
+                    "id": fila["id"],
+                    "empresa_id": fila["empresa_id"],
+                    "empresa": fila["empresa__nombre"],
+                    "valor": fila["valor"],
+                    columna: fila[columna],
+                }
+                for fila in data
+            ],
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["get"], url_path=r"estadisticas/(?P<requisito_input_id>\d+)")
+    def estadisticas_input(self, request, requisito_input_id=None):
+        """
+        Mínimo, máximo, promedio (solo números) y cantidad de respuestas de un input
+        entre todas las empresas de la gestión, calculados en la base de datos.
+        """
+        requisito_input, columna, qs = self._filtrar_valores_tipados(request, requisito_input_id)
+        if requisito_input is None:
+            return qs
+
+        agregados = {
+            "minimo": Min(columna),
+            "maximo": Max(columna),
+            "cantidad": Count(columna),
+        }
+        if columna == "valor_numero":
+            agregados["promedio"] = Avg(columna)
+        resultado = qs.aggregate(**agregados)
+        resultado["requisito_input"] = requisito_input.id
+        resultado["input_type"] = requisito_input.input_type
+        return Response(resultado, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="exportar-zip")
+    def exportar_zip(self, request):
+        """
+        Descarga en streaming un ZIP con todos los archivos de la postulación y un
+        manifiesto.csv con los valores de texto, número y fecha.
+        Parámetros: ?empresa_id= o ?tipoSello_id= (uno de los dos); gestión de la cookie.
+        """
+        gestion = request.query_params.get("gestion") or request.COOKIES.get("gestion")
+        empresa_id = request.query_params.get("empresa_id")
+        tipo_sello_id = request.query_params.get("tipoSello_id")
+
+        if not gestion or not (empresa_id or tipo_sello_id):
+            return Response(
+                {"error": "Se requiere la gestión y 'empresa_id' o 'tipoSello_id'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if any(param and not param.isdigit() for param in (empresa_id, tipo_sello_id)):
+            return Response(
+                {"error": "'empresa_id' y 'tipoSello_id' deben ser numéricos."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Un usuario de empresa solo puede exportar su propia postulación
+        if getattr(request.user, "empresa_id", None):
+            if tipo_sello_id or (empresa_id and int(empresa_id) != request.user.empresa_id):
+                return Response(
+                    {"detail": "Solo puede exportar la postulación de su empresa."},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+
+        valores = RequisitoInputValor.objects.filter(gestion=gestion)
+        if empresa_id:
+            valores = valores.filter(empresa_id=empresa_id)
+        if tipo_sello_id:
+            valores = valores.filter(requisito_input__requisito__tipoSello_id=tipo_sello_id)
+        valores = valores.select_related("empresa", "requisito_input__requisito").order_by(
+            "empresa_id", "requisito_input__requisito_id", "requisito_input_id"
+        )
+
+        nombre = get_valid_filename(
+            f"postulacion_{gestion}_{'empresa_' + empresa_id if empresa_id else 'sello_' + tipo_sello_id}.zip"
+        )
+        response = StreamingHttpResponse(
+            iterar_en_async(generar_zip_postulacion(valores)), content_type="application/zip"
+        )
+        response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+
+        log_user_action(request.user, f"Descargó el ZIP de postulación {nombre}", request)
+        return response
+
     @action(
         detail=False,
         methods=["get"],
@@ -993,13 +1313,134 @@ class EvaluacionDatoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+# ========================
+# REPORTES DE EVALUACIÓN
+# ========================
+class ReporteEvaluacionViewSet(viewsets.ModelViewSet):
+    """
+    Reportes de resultados por empresa o por tipo de sello, generados por Celery.
+    POST devuelve el reporte ya generado si los EvaluacionDato no cambiaron desde
+    entonces; si cambiaron encola uno nuevo y responde 202.
+    """
+    serializer_class = ReporteEvaluacionSerializer
+    permission_classes = [IsAuthenticated, HasPermissionMap]
+    http_method_names = ["get", "post", "head", "options"]
+
+    permission_code_map = {
+        "list": "listar_evaluacion_dato",
+        "retrieve": "listar_evaluacion_dato",
+        "create": "listar_evaluacion_dato",
+        "descargar": "listar_evaluacion_dato",
+    }
+
+    def get_queryset(self):
+        qs = ReporteEvaluacion.objects.all().order_by("-created_at")
+        gestion = self.request.COOKIES.get("gestion")
+        if gestion:
+            qs = qs.filter(gestion=gestion)
+        return qs
+
+    def create(self, request, *args, **kwargs):
+        gestion = request.COOKIES.get("gestion")
+        if not gestion:
+            return Response({"error": "No se pudo obtener la gestión de las cookies."}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        empresa = serializer.validated_data.get("empresa")
+        tipo_sello = serializer.validated_data.get("tipoSello")
+        formato = serializer.validated_data.get("formato", "csv")
+
+        version = version_datos_evaluacion(
+            gestion, empresa.id if empresa else None, tipo_sello.id if tipo_sello else None
+        )
+        existente = (
+            ReporteEvaluacion.objects.filter(
+                gestion=gestion, empresa=empresa, tipoSello=tipo_sello, formato=formato, version=version,
+            )
+            .exclude(estado="ERROR")
+            .order_by("-created_at")
+            .first()
+        )
+        if existente:
+            return Response(self.get_serializer(existente).data, status=status.HTTP_200_OK)
+
+        reporte = serializer.save(gestion=gestion, version=version, solicitado_por=request.user)
+        generar_reporte_evaluacion.delay(reporte.id)
+        log_user_action(request.user, f"Solicitó el reporte de evaluación {reporte.id} ({formato})", request)
+        return Response(self.get_serializer(reporte).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=["get"])
+    def descargar(self, request, pk=None):
+        reporte = self.get_object()
+        if reporte.estado != "LISTO" or not reporte.archivo:
+            return Response(
+                {"detail": f"El reporte aún no está disponible (estado: {reporte.estado})."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        nombre = f"reporte_evaluacion_{reporte.gestion}_{reporte.id}.{reporte.formato}"
+        return FileResponse(reporte.archivo.open("rb"), as_attachment=True, filename=nombre)
+
+
+# ========================
+# COMPLETITUD DE POSTULACIÓN
+# ========================
+class CompletitudPostulacionViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Avance de la postulación por empresa, leído del índice CompletitudPostulacion.
+    Filtros: ?tipoSello=, ?gestion= (por defecto la cookie), ?estado=completo|incompleto,
+    ?faltantes_max= y ?ordering=faltantes|-faltantes|respondidos|-respondidos|updated_at|-updated_at.
+    """
+    serializer_class = CompletitudPostulacionSerializer
+    permission_classes = [IsAuthenticated, HasPermissionMap]
+
+    permission_code_map = {
+        "list": "ver_completitud_postulacion",
+        "retrieve": "ver_completitud_postulacion",
+    }
+
+    ordenes_validos = {"faltantes", "-faltantes", "respondidos", "-respondidos", "updated_at", "-updated_at"}
+
+    def get_queryset(self):
+        params = self.request.query_params
+        qs = CompletitudPostulacion.objects.select_related("empresa", "tipoSello")
+
+        gestion = params.get("gestion") or self.request.COOKIES.get("gestion")
+        tipo_sello = params.get("tipoSello")
+        for nombre, valor in (("gestion", gestion), ("tipoSello", tipo_sello)):
+            if valor and not str(valor).isdigit():
+                raise ValidationError({nombre: "Debe ser numérico."})
+
+        if gestion:
+            qs = qs.filter(gestion=gestion)
+        if tipo_sello:
+            qs = qs.filter(tipoSello_id=tipo_sello)
+
+        estado = params.get("estado")
+        if estado == "completo":
+            qs = qs.filter(faltantes=0)
+        elif estado == "incompleto":
+            qs = qs.filter(faltantes__gt=0)
+
+        faltantes_max = params.get("faltantes_max")
+        if faltantes_max and faltantes_max.isdigit():
+            qs = qs.filter(faltantes__lte=int(faltantes_max))
+
+        ordering = params.get("ordering", "faltantes")
+        if ordering not in self.ordenes_validos:
+            ordering = "faltantes"
+        return qs.order_by(ordering, "empresa__nombre")
+
+
 # ========================
 # ENLACES
 # ========================
-class EnlacesViewSet(viewsets.ModelViewSet):
+class EnlacesViewSet(AccionesMasivasMixin, viewsets.ModelViewSet):
     queryset = Enlaces.objects.all().order_by("nombre")
     serializer_class = EnlacesSerializer
     permission_classes = [IsAuthenticated, HasPermissionMap]
+    accion_estado_masiva = "toggle"
+    nombre_masivo = "enlaces"
 
     permission_code_map = {
         "list": "ver_enlaces",
@@ -1042,5 +1483,8 @@ class EnlacesViewSet(viewsets.ModelViewSet):
         Devuelve solo los enlaces que están activos.
         """
         qs = self.get_queryset().filter(is_active=True)
-        serializer = self.get_serializer(qs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return respuesta_condicional(
+            request,
+            [(qs, "updated_at")],
+            lambda: self.get_serializer(qs, many=True).data,
+        )
\ No newline at end of file